@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+import queries
+from genre_masks import genre_masks
+from models import Venue, Artist, Shows, db
+from validation import GENRES
+
+
+# Bulk export of shows, venues and artists as NDJSON or CSV.
+#
+# Rows come from a server-side cursor (yield_per) as plain column tuples, are
+# serialized into chunks of about EXPORT_CHUNK_BYTES and streamed out, so
+# memory stays flat however many rows are exported. Responses are gzipped on
+# the fly when the client accepts it.
+#
+#   /api/shows.ndjson?since=2030-01-01&until=2030-02-01
+#   /api/venues.csv?updated_since=2026-10-01T00:00:00
+#
+# /api/venues/available lists the venues with no show booked in a time slot:
+#
+#   /api/venues/available?state=CA&start=2026-10-24T20:00&end=2026-10-24T23:00&genre=Jazz
+#
+# /api/venues/genres and /api/artists/genres count and list (by id) those with
+# all of the given genres, or any of them with match=any (see genre_masks.py):
+#
+#   /api/artists/genres?genre=Jazz&genre=Blues&match=any&limit=20
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _shows_query():
+    return db.session.query(
+        Shows.id,
+        Shows.start_time,
+        Shows.duration_minutes,
+        Shows.venue_id,
+        Venue.name.label('venue_name'),
+        Shows.artist_id,
+        Artist.name.label('artist_name'),
+        Shows.updated_at,
+    ).join(Venue, Shows.venue_id == Venue.id).join(Artist, Shows.artist_id == Artist.id)
+
+
+def _venues_query():
+    return db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+        Venue.genres, Venue.image_link, Venue.facebook_link, Venue.website_link,
+        Venue.looking_for_talent, Venue.seeking_description, Venue.updated_at)
+
+
+def _artists_query():
+    return db.session.query(
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.genres, Artist.image_link, Artist.facebook_link, Artist.website_link,
+        Artist.looking_for_venue, Artist.seeking_description, Artist.updated_at)
+
+
+# resource -> (query factory, model, column filtered by since/until)
+EXPORTS = {
+    'shows': (_shows_query, Shows, Shows.start_time),
+    'venues': (_venues_query, Venue, None),
+    'artists': (_artists_query, Artist, None),
+}
+
+
+def _datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description='%s must be an ISO 8601 date or datetime' % name)
+
+
+def _export_query(resource):
+    make_query, model, time_column = EXPORTS[resource]
+    query = make_query()
+    since, until = _datetime_arg('since'), _datetime_arg('until')
+    if since or until:
+        if time_column is None:
+            abort(400, description='since/until only apply to shows')
+        if since:
+            query = query.filter(time_column >= since)
+        if until:
+            query = query.filter(time_column < until)
+    updated_since = _datetime_arg('updated_since')
+    if updated_since:
+        query = query.filter(model.updated_at >= updated_since)
+    return query.order_by(model.id).yield_per(current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ';'.join(value)
+    return value
+
+
+def _ndjson_rows(query):
+    for row in query:
+        yield json.dumps({k: _json_value(v) for k, v in row._mapping.items()}) + '\n'
+
+
+def _csv_rows(query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c['name'] for c in query.column_descriptions])
+    for row in query:
+        writer.writerow([_csv_value(v) for v in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # the header alone, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _chunked(lines, chunk_bytes):
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(chunk).encode()
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk).encode()
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+FORMATS = {
+    'ndjson': (_ndjson_rows, 'application/x-ndjson'),
+    'csv': (_csv_rows, 'text/csv'),
+}
+
+
+@api.route('/<any(shows, venues, artists):resource>.<any(ndjson, csv):fmt>')
+def export(resource, fmt):
+    query = _export_query(resource)
+    serialize, mimetype = FORMATS[fmt]
+    body = _chunked(serialize(query), current_app.config.get('EXPORT_CHUNK_BYTES', 64 * 1024))
+    headers = {
+        'Content-Disposition': 'attachment; filename=%s.%s' % (resource, fmt),
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.accept_encodings:
+        body = _gzipped(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+@api.route('/venues/available')
+def available_venues():
+    state = request.args.get('state')
+    start, end = _datetime_arg('start'), _datetime_arg('end')
+    if not state or not start or not end:
+        abort(400, description='state, start and end are required')
+    if start.tzinfo or end.tzinfo:
+        abort(400, description='start and end are local times, without a UTC offset')
+    if end <= start:
+        abort(400, description='end must be after start')
+    genre = request.args.get('genre')
+    if genre and genre not in GENRES:
+        abort(400, description='unknown genre %s' % genre)
+    limit = request.args.get('limit', 50, type=int)
+    if not 0 < limit <= 500:
+        abort(400, description='limit must be between 1 and 500')
+    return jsonify({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "data": queries.available_venues(state, start, end, genre, request.args.get('city'), limit),
+    })
+
+
+@api.route('/<any(venues, artists):resource>/genres')
+def genre_matches(resource):
+    genres = sorted(set(request.args.getlist('genre')))
+    if not genres:
+        abort(400, description='genre is required')
+    unknown = [genre for genre in genres if genre not in GENRES]
+    if unknown:
+        abort(400, description='unknown genre %s' % ', '.join(unknown))
+    match = request.args.get('match', 'all')
+    if match not in ('all', 'any'):
+        abort(400, description='match must be all or any')
+    limit = request.args.get('limit', 50, type=int)
+    if not 0 < limit <= 500:
+        abort(400, description='limit must be between 1 and 500')
+    owner = Venue if resource == 'venues' else Artist
+    return jsonify(dict(genre_masks.matches(owner, genres, match, limit), genres=genres, match=match))
@@ -2,58 +2,180 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import json
-
-from flask_migrate import Migrate
-import dateutil.parser
-import babel
-from flask import (Flask, render_template, request, Response,
-                   flash, redirect, url_for)
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import os
+
+from flask import (Blueprint, Flask, current_app, render_template, request, Response,
+                   flash, redirect, url_for, abort, jsonify)
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from models import Venue, Artist, Shows, db
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+from models import Venue, Artist, Shows, db, raise_on_lazy_load
 import config
-from forms import *
+import dbpool
+import queries
+from metrics import metrics
+from api import api
+from assets import assets
+from conditional import conditional_get
+from datefmt import formatter as datetime_formatter
+import facets
+from genre_masks import genre_masks
+import summaries
+from page_cache import page_cache
+from querycount import query_budget, query_tracker
+from search_index import search_index
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-# db = SQLAlchemy(app)
-db.init_app(app)
-# TODO: connect to a local postgresql database
-migrate = Migrate(app, db)
+bp = Blueprint('main', __name__)
+
+
+def create_app(config_name=None, cli=None):
+    # config_name is a key of config.profiles, by default $FYYUR_ENV; the
+    # `flask` commands are registered when run by the flask CLI (or cli=True)
+    config_name = config_name or os.environ.get('FYYUR_ENV', 'development')
+    if config_name not in config.profiles:
+        raise RuntimeError('unknown FYYUR_ENV %r, expected one of %s' % (
+            config_name, ', '.join(sorted(config.profiles))))
+    app = Flask(__name__)
+    app.config.from_object('config')
+    app.config.from_object(config.profiles[config_name])
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError('SECRET_KEY must be set in the environment for the %s profile' % config_name)
+
+    dbpool.init_app(app)
+    db.init_app(app)
+    if app.config['RAISE_ON_LAZY_LOAD']:
+        raise_on_lazy_load()
+    search_index.init_app(app)
+    genre_masks.init_app(app)
+    page_cache.init_app(app)
+    summaries.init_app(app)
+    facets.init_app(app)
+    datetime_formatter.init_app(app)
+    assets.init_app(app)
+    conditional_get.init_app(app, assets)
+    query_tracker.init_app(app)
+    if cli is None:
+        cli = os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+    if cli:
+        register_commands(app)
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+    metrics.init_app(app)
+    configure_logging(app)
+    return app
+
+
+def register_commands(app):
+    # Alembic (through Flask-Migrate) and the bulk data tools are only needed
+    # by `flask` commands, so web workers never import them
+    from flask_migrate import Migrate
+    from importer import import_command
+    from seed import seed_command
+    from bench import bench_command
+    from startup import startup_profile_command
+
+    Migrate(app, db)
+    app.cli.add_command(import_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(bench_command)
+    app.cli.add_command(startup_profile_command)
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
-
-app.jinja_env.filters['datetime'] = format_datetime
+# The `datetime` filter is registered by datetime_formatter.init_app (datefmt.py)
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
+# Form views import their form class when first called: WTForms and Flask-WTF
+# (which pulls in Babel) are not needed to serve the listing and detail pages.
+
+
+def page_args():
+    # keyset pagination arguments shared by the listing pages
+    per_page = request.args.get('per_page', current_app.config['LISTING_PAGE_SIZE'], type=int)
+    return {
+        "after": request.args.get('after'),
+        "before": request.args.get('before'),
+        "per_page": min(max(per_page, 1), current_app.config['LISTING_MAX_PAGE_SIZE']),
+    }
+
 
-@app.route('/')
+def facet_args():
+    # browse filters of the listing pages, e.g.
+    # ?genre=Jazz&genre=Blues&state=CA&city=San+Francisco&seeking=1&upcoming=0
+    filters = {}
+    genres = request.args.getlist('genre')
+    if genres:
+        filters['genres'] = sorted(set(genres))
+    for name in ('state', 'city'):
+        if request.args.get(name):
+            filters[name] = request.args[name]
+    for name in ('seeking', 'upcoming'):
+        value = request.args.get(name)
+        if value is not None:
+            if value not in ('0', '1'):
+                raise ValueError('%s must be 0 or 1' % name)
+            filters[name] = value == '1'
+    return filters
+
+
+def sort_matches(filters, counts):
+    # few matches are cheaper to sort than to find along the listing's index
+    return bool(filters) and counts["total"] <= current_app.config['BROWSE_SORT_MATCHES']
+
+
+def facet_panels(counts, filters, seeking_title):
+    # the facet lists of a listing page: every value with its count and the
+    # URL arguments that select it, or unselect it when it is selected
+    args = {"per_page": request.args.get('per_page')}
+    if filters.get('genres'):
+        args['genre'] = filters['genres']
+    args.update((name, filters[name]) for name in ('state', 'city') if name in filters)
+    args.update((name, int(filters[name])) for name in ('seeking', 'upcoming') if name in filters)
+
+    def link(label, count, selected, **changes):
+        link_args = dict(args, **changes)
+        return {"label": label, "count": count, "selected": selected,
+                "args": {k: v for k, v in link_args.items() if v is not None}}
+
+    selected_genres = filters.get('genres', [])
+    genre_counts = dict(counts['genres'])
+    genres = [link(genre, count, genre in selected_genres,
+                   genre=sorted(set(selected_genres) ^ {genre}) or None)
+              for genre, count in counts['genres']]
+    genres += [link(genre, 0, True, genre=sorted(set(selected_genres) - {genre}) or None)
+               for genre in selected_genres if genre not in genre_counts]
+    states = [link(state, count, state == filters.get('state'),
+                   state=None if state == filters.get('state') else state, city=None)
+              for state, count in counts['state']]
+    cities = [link(city, count, city == filters.get('city'),
+                   city=None if city == filters.get('city') else city)
+              for city, count in counts['city']]
+    panels = [{"title": "Genres", "links": genres}, {"title": "State", "links": states}]
+    if cities:
+        panels.append({"title": "City", "links": cities})
+    for name, title in (('seeking', seeking_title), ('upcoming', 'Upcoming shows')):
+        panels.append({"title": title, "links": [
+            link(label, counts[name].get(value, 0), filters.get(name) is value,
+                 **{name: None if filters.get(name) is value else int(value)})
+            for value, label in ((True, 'Yes'), (False, 'No'))]})
+    return {"total": counts['total'], "panels": panels, "args": args,
+            "filtered": bool(filters)}
+
+
+@bp.route('/')
+@query_budget(0)
 def index():
     return render_template('pages/home.html')
 
@@ -61,97 +183,53 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
+# page of venues, facet counts
+@query_budget(2)
 def venues():
-    data = []
-    # TODO: replace with real venues data.
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-
-    city_state_output = Venue.query.distinct(Venue.city, Venue.state).all()
-    for cs in city_state_output:
-        city_state_venue = {
-            "city": cs.city,
-            "state": cs.state
-        }
-        venue_by_city_state = Venue.query.filter_by(city=cs.city, state=cs.state).all()
-        all_venues = []
-        for venue in venue_by_city_state:
-            all_venues.append({
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), venue.shows)))
-            })
-
-        city_state_venue["venues"] = all_venues
-        data.append(city_state_venue)
-
-    return render_template('pages/venues.html', areas=data);
-
-
-@app.route('/venues/search', methods=['POST'])
+    # areas -> venues -> num_upcoming_shows for one page of venues, in one query
+    try:
+        filters = facet_args()
+        counts = queries.venue_facets(filters)
+        data, pager = queries.venue_areas(filters=filters, sort=sort_matches(filters, counts), **page_args())
+    except ValueError:
+        abort(400)
+    browse = facet_panels(counts, filters, 'Seeking talent')
+    return conditional_get.render_template('pages/venues.html', areas=data, pager=pager, facets=browse)
+
+
+@bp.route('/venues/search', methods=['POST'])
+@query_budget(1)
 def search_venues():
     # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    search_term = request.form.get("search_term")
-
-    response = {}
-    count = 0
-    data = []
-    venues = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-
-    for v in venues:
-        venue = {
-            "id": v.id,
-            "name": v.name,
-            "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), v.shows)))
-        }
-        data.append(venue)
-    response["count"] = len(venues)
-    response["data"] = data
+    search_term = request.form.get('search_term', '')
+    page = request.form.get('page', 1, type=int)
+    response = search_index.search_venues(search_term, page=max(page, 1),
+                                          per_page=current_app.config['SEARCH_PAGE_SIZE'])
 
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
+# validator, venue, show counts, upcoming page, past page
+@query_budget(5)
+@conditional_get.validated(queries.venue_version)
+@page_cache.cached('venue', 'venue_id')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
 
-    venue = Venue.query.get(venue_id)
-    print("Shows are ", venue.shows)
-    upcoming_shows_obj = []
-    past_shows_obj = []
-    for u in venue.shows:
-        temp = {
-            "artist_id": u.artist_id,
-            "artist_name": u.artist.name,
-            "artist_image_link": u.artist.image_link,
-            "start_time": str(u.start_time)
-        }
-        if datetime.now() < u.start_time:
-            upcoming_shows_obj.append(temp)
-        else:
-            past_shows_obj.append(temp)
-    # upcoming_shows = list(filter(lambda x: x.start_time > datetime.now(), venue.shows))
-    # past_shows = list(filter(lambda x: x.start_time < datetime.now(), venue.shows))
-    # for u in upcoming_shows:
-    #     upcoming = {
-    #         "artist_id": u.artist_id,
-    #         "artist_name": u.artist.name,
-    #         "artist_image_link": u.artist.image_link,
-    #         "start_time": str(u.start_time)
-    #     }
-    #     upcoming_shows_obj.append(upcoming)
-    # for p in past_shows:
-    #     past = {
-    #         "artist_id": p.artist_id,
-    #         "artist_name": p.artist.name,
-    #         "artist_image_link": p.artist.image_link,
-    #         "start_time": str(p.start_time)
-    #     }
-    #     past_shows_obj.append(past)
+    venue = Venue.query.options(*queries.VENUE_DETAIL).get_or_404(venue_id)
+    try:
+        shows = queries.venue_shows(venue_id,
+                                    upcoming_after=request.args.get('upcoming_after'),
+                                    past_before=request.args.get('past_before'),
+                                    limit=current_app.config['DETAIL_SHOWS_LIMIT'])
+    except ValueError:
+        abort(400)
     genres = venue.genres
     data = {
         "id": venue.id,
@@ -166,25 +244,27 @@ def show_venue(venue_id):
         "seeking_talent": venue.looking_for_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows": past_shows_obj,
-        "upcoming_shows": upcoming_shows_obj,
-        "past_shows_count": len(past_shows_obj),
-        "upcoming_shows_count": len(upcoming_shows_obj),
     }
+    data.update(shows)
     return render_template('pages/show_venue.html', venue=data)
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
+@query_budget(0)
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
+# the insert, then the venue's facet and rollup recount
+@query_budget(5)
 def create_venue_submission():
+    from forms import VenueForm
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
 
@@ -225,104 +305,77 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+# venue + its shows, two deletes, two summary refreshes, the venue's facet
+# and rollup recount, then those of the artists a show count change may have
+# flipped
+@query_budget(16)
 def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    venue = Venue.query.options(*queries.VENUE_DELETE).get_or_404(venue_id)
     try:
-        v = Venue.query.get(venue_id)
-        db.session.delete(v)
-        db.commit()
-    except:
+        db.session.delete(venue)
+        db.session.commit()
+    except StaleDataError:
+        # the venue or one of its shows changed since it was loaded (row versions)
         db.session.rollback()
+        abort(409)
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('deleting venue %s failed', venue_id)
+        abort(500)
     finally:
         db.session.close()
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the homepage
-    return None
+    return '', 204
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@bp.route('/artists')
+# page of artists, facet counts
+@query_budget(2)
 def artists():
-    # TODO: replace with real data returned from querying the database
-    artists = Artist.query.distinct().all()
-    data = []
-    for a in artists:
-        artist = {
-            "id": a.id,
-            "name": a.name
-        }
-        data.append(artist)
-
-    return render_template('pages/artists.html', artists=data)
+    try:
+        filters = facet_args()
+        counts = queries.artist_facets(filters)
+        data, pager = queries.artists_page(filters=filters, sort=sort_matches(filters, counts), **page_args())
+    except ValueError:
+        abort(400)
+    browse = facet_panels(counts, filters, 'Seeking venues')
+    return conditional_get.render_template('pages/artists.html', artists=data, pager=pager, facets=browse)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
+@query_budget(1)
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search_term = request.form.get("search_term")
-
-    response = {}
-    count = 0
-    data = []
-    artists = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-
-    for a in artists:
-        artist = {
-            "id": a.id,
-            "name": a.name,
-            "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), a.shows)))
-        }
-        data.append(artist)
-    response["count"] = len(artists)
-    response["data"] = data
+    search_term = request.form.get('search_term', '')
+    page = request.form.get('page', 1, type=int)
+    response = search_index.search_artists(search_term, page=max(page, 1),
+                                           per_page=current_app.config['SEARCH_PAGE_SIZE'])
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+# validator, artist, show counts, upcoming page, past page
+@query_budget(5)
+@conditional_get.validated(queries.artist_version)
+@page_cache.cached('artist', 'artist_id')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     # TODO: replace with real artist data from the artist table, using artist_id
-    artist = Artist.query.get(artist_id)
-
-    upcoming_shows_obj = []
-    past_shows_obj = []
-    for u in artist.shows:
-        temp = {
-            "venue_id": u.venue_id,
-            "venue_name": u.venue.name,
-            "venue_image_link": u.venue.image_link,
-            "start_time": str(u.start_time)
-        }
-        if datetime.now() < u.start_time:
-            upcoming_shows_obj.append(temp)
-        else:
-            past_shows_obj.append(temp)
-    # upcoming_shows = list(filter(lambda x: x.start_time > datetime.now(), artist.shows))
-    # past_shows = list(filter(lambda x: x.start_time < datetime.now(), artist.shows))
-    # upcoming_shows_obj = []
-    # past_shows_obj = []
-    # for u in upcoming_shows:
-    #     upcoming = {
-    #         "venue_id": u.venue_id,
-    #         "venue_name": u.venue.name,
-    #         "venue_image_link": u.venue.image_link,
-    #         "start_time": str(u.start_time)
-    #     }
-    #     upcoming_shows_obj.append(upcoming)
-    # for p in past_shows:
-    #     past = {
-    #         "venue_id": p.venue_id,
-    #         "venue_name": p.venue.name,
-    #         "venue_image_link": p.venue.image_link,
-    #         "start_time": str(p.start_time)
-    #     }
-    #     past_shows_obj.append(past)
+    artist = Artist.query.options(*queries.ARTIST_DETAIL).get_or_404(artist_id)
+    try:
+        shows = queries.artist_shows(artist_id,
+                                     upcoming_after=request.args.get('upcoming_after'),
+                                     past_before=request.args.get('past_before'),
+                                     limit=current_app.config['DETAIL_SHOWS_LIMIT'])
+    except ValueError:
+        abort(400)
     genres = artist.genres
     data = {
         "id": artist.id,
@@ -336,21 +389,20 @@ def show_artist(artist_id):
         "seeking_venue": artist.looking_for_venue,
         "seeking_description": artist.seeking_description,
         "image_link": artist.image_link,
-        "past_shows": past_shows_obj,
-        "upcoming_shows": upcoming_shows_obj,
-        "past_shows_count": len(past_shows_obj),
-        "upcoming_shows_count": len(upcoming_shows_obj),
     }
+    data.update(shows)
 
     return render_template('pages/show_artist.html', artist=data)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_artist(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.options(*queries.ARTIST_FORM).get_or_404(artist_id)
     form.name.data = artist.name
     form.city.data = artist.city
     form.state.data = artist.state
@@ -366,11 +418,15 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+# artist, the update, its facet and rollup recount, then the refreshed_at
+# (Last-Modified) of the venues it plays at
+@query_budget(7)
 def edit_artist_submission(artist_id):
+    from forms import ArtistForm
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.options(*queries.ARTIST_FORM).get_or_404(artist_id)
     aform = ArtistForm(request.form, meta={"csrf": False})
 
     if aform.validate():
@@ -403,12 +459,14 @@ def edit_artist_submission(artist_id):
         for field, err in aform.errors.items():
             message.append(field + ' ' + '|'.join(err))
         flash('Errors/invalid values in ' + str(message))
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    from forms import VenueForm
+    venue = Venue.query.options(*queries.VENUE_FORM).get_or_404(venue_id)
     genre = venue.genres
     form = VenueForm()
     form.name.data = venue.name
@@ -426,11 +484,15 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+# venue, the update, its facet and rollup recount, then the refreshed_at
+# (Last-Modified) of the artists playing there
+@query_budget(7)
 def edit_venue_submission(venue_id):
+    from forms import VenueForm
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.options(*queries.VENUE_FORM).get_or_404(venue_id)
     form = VenueForm(request.form, meta={'csrf': False})
 
     if form.validate():
@@ -462,20 +524,25 @@ def edit_venue_submission(venue_id):
         for field, err in form.errors.items():
             message.append(field + ' ' + '|'.join(err))
         flash('Errors/invalid values in ' + str(message))
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
+@query_budget(0)
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
+# the insert, then the artist's facet and rollup recount
+@query_budget(5)
 def create_artist_submission():
+    from forms import ArtistForm
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -520,35 +587,39 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
+@query_budget(1)
 def shows():
     # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    shows = Shows.query.all()
-    data = []
-    for s in shows:
-        show_data = {
-            "venue_id": s.venue.id,
-            "venue_name": s.venue.name,
-            "artist_id": s.artist.id,
-            "artist_name": s.artist.name,
-            "artist_image_link": s.artist.image_link,
-            "start_time": str(s.start_time)
-        }
-        data.append(show_data)
-
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
+    try:
+        data, pager = queries.shows_page(**page_args())
+    except ValueError:
+        abort(400)
+    datetime_formatter.format_shows(data, 'full')
+    return render_template('pages/shows.html', shows=data, pager=pager)
+
+
+@bp.route('/shows/create')
+@query_budget(0)
 def create_shows():
+    from forms import ShowForm
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+BOOKING_CONFLICTS = {
+    'ex_Shows_venue_booking': 'The venue is already booked at that time. Show could not be added.',
+    'ex_Shows_artist_booking': 'The artist is already booked at that time. Show could not be added.',
+}
+
+
+@bp.route('/shows/create', methods=['POST'])
+# the insert, then for the venue and the artist a summary refresh and, when
+# it was their first upcoming show, their facet and rollup recount
+@query_budget(13)
 def create_show_submission():
+    from forms import ShowForm
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
     form = ShowForm(request.form, meta={"csrf": False})
@@ -557,12 +628,21 @@ def create_show_submission():
             show = Shows(
                 venue_id=form.venue_id.data,
                 artist_id=form.artist_id.data,
-                start_time=form.start_time.data
+                start_time=form.start_time.data,
+                duration_minutes=form.duration_minutes.data
             )
             db.session.add(show)
             db.session.commit()
             # on successful db insert, flash success
             flash('Show was successfully added!')
+        except IntegrityError as e:
+            db.session.rollback()
+            # the exclusion constraints on Shows.during reject overlapping bookings
+            constraint = getattr(getattr(e.orig, 'diag', None), 'constraint_name', None)
+            if constraint in BOOKING_CONFLICTS:
+                flash(BOOKING_CONFLICTS[constraint])
+            else:
+                flash('An error occurred. Show could not be added.')
         except:
             db.session.rollback()
             # TODO: on unsuccessful db insert, flash an error instead.
@@ -582,17 +662,37 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  Stats
+#  ----------------------------------------------------------------
+
+@bp.route('/_stats/page-cache')
+def page_cache_stats():
+    return jsonify(page_cache.stats())
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/_stats/db-pool')
+def db_pool_stats():
+    return jsonify(dbpool.pool_metrics.snapshot(db.engine.pool))
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+def configure_logging(app):
+    if app.debug:
+        return
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -608,11 +708,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
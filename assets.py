@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import time
+
+import click
+from flask import abort, current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+
+# Fingerprinted, precompressed static files.
+#
+# `flask assets build` copies every file under static/ to static/<ASSETS_DIR>
+# with a content hash in its name (css/main.css -> css/main.1f3a9c0b2d4e.css)
+# and, for compressible types, writes .gz and .br variants next to it when
+# they are smaller. url() references between CSS and the files it loads are
+# rewritten to the hashed names before hashing. The mapping goes to
+# manifest.json.
+#
+# With ASSETS_USE_MANIFEST on, url_for('static', filename=...) returns the
+# hashed URL of every file in the manifest (others are left alone), and those
+# URLs are served with a far-future immutable Cache-Control, since their
+# content can never change. The encoded variant is picked from
+# Accept-Encoding; nothing is compressed per request. Rebuild after changing
+# a static file and restart the workers, which read the manifest at startup.
+
+# by extension; others (images, woff/woff2) are compressed already
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.eot', '.ttf', '.otf', '.ico'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+MANIFEST = 'manifest.json'
+
+
+def _hashed_name(path, content):
+    base, ext = posixpath.splitext(path)
+    return '%s.%s%s' % (base, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def _rewrite_css(path, content, files):
+    # url(...) of files in the manifest -> their hashed names, relative as before
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if re.match(r'^(data:|[a-z]+:|//|/|#)', target):
+            return match.group(0)
+        cut = min(i for i in (target.find('?'), target.find('#'), len(target)) if i >= 0)
+        resolved = posixpath.normpath(posixpath.join(directory, target[:cut]))
+        if resolved not in files:
+            return match.group(0)
+        hashed = posixpath.relpath(files[resolved], directory)
+        return 'url(%s%s%s%s)' % (quote, hashed, target[cut:], quote)
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _compress(data):
+    # {encoding: bytes} for the variants worth keeping
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+def build(static_dir, output_dir):
+    # writes output_dir afresh; returns the manifest
+    sources = []
+    for root, dirs, names in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output_dir)
+        for name in sorted(names):
+            sources.append(posixpath.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    # CSS last, so the files it references already have their hashed names
+    sources.sort(key=lambda path: path.endswith('.css'))
+
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    files, encodings = {}, {}
+    for path in sources:
+        with open(os.path.join(static_dir, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content, files)
+        hashed = files[path] = _hashed_name(path, content)
+        target = os.path.join(output_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        if posixpath.splitext(path)[1].lower() not in COMPRESSIBLE:
+            continue
+        variants = _compress(content)
+        for encoding, body in variants.items():
+            with open(target + ('.br' if encoding == 'br' else '.gz'), 'wb') as f:
+                f.write(body)
+        if variants:
+            encodings[hashed] = sorted(variants)
+
+    manifest = {"files": files, "encodings": encodings}
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+
+    def __init__(self):
+        self.files = {}
+        self.encodings = {}
+        self.directory = None
+        self.max_age = 31536000
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.static_folder, app.config.get('ASSETS_DIR', 'dist'))
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 31536000)
+        app.cli.add_command(assets_cli)
+        self.files, self.encodings = {}, {}
+        if not app.config.get('ASSETS_USE_MANIFEST'):
+            return
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            app.logger.warning('no asset manifest in %s; run `flask assets build`', self.directory)
+            return
+        self.files, self.encodings = manifest['files'], manifest['encodings']
+        prefix = posixpath.relpath(self.directory, app.static_folder).replace(os.sep, '/')
+        app.add_url_rule('%s/%s/<path:filename>' % (app.static_url_path, prefix),
+                         'asset', self.send)
+        app.url_defaults(self._hashed_url)
+        # hashed names of the files in the manifest, under the static URL
+        self.files = {name: '%s/%s' % (prefix, hashed) for name, hashed in self.files.items()}
+
+    def _hashed_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def send(self, filename):
+        if filename == MANIFEST:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        available = self.encodings.get(filename, ())
+        accepted = request.accept_encodings
+        encoding = next((e for e in ('br', 'gzip') if e in available and accepted[e] > 0), None)
+        served = filename + {'br': '.br', 'gzip': '.gz', None: ''}[encoding]
+        response = send_from_directory(self.directory, served, mimetype=mimetype,
+                                       download_name=posixpath.basename(filename),
+                                       max_age=self.max_age, conditional=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if available:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+assets = Assets()
+
+
+@click.group('assets')
+def assets_cli():
+    """Static asset commands."""
+
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    """Fingerprint and precompress the files under static/."""
+    started = time.perf_counter()
+    output_dir = os.path.join(current_app.static_folder, current_app.config.get('ASSETS_DIR', 'dist'))
+    manifest = build(current_app.static_folder, output_dir)
+    sizes = {'': 0, 'gzip': 0, 'br': 0}
+    for hashed in manifest['files'].values():
+        path = os.path.join(output_dir, hashed)
+        size = os.path.getsize(path)
+        sizes[''] += size
+        for encoding in ('gzip', 'br'):
+            if encoding in manifest['encodings'].get(hashed, ()):
+                size_encoded = os.path.getsize(path + ('.br' if encoding == 'br' else '.gz'))
+            else:
+                size_encoded = size
+            sizes[encoding] += size_encoded
+    click.echo('%d files in %s in %.1fs: %.0fKB, %.0fKB gzip, %.0fKB brotli' % (
+        len(manifest['files']), output_dir, time.perf_counter() - started,
+        sizes[''] / 1024.0, sizes['gzip'] / 1024.0, sizes['br'] / 1024.0))
+    if not any('br' in e for e in manifest['encodings'].values()):
+        click.echo('brotli is not installed; only gzip variants were written', err=True)
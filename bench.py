@@ -0,0 +1,236 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db
+from page_cache import page_cache
+from querycount import QueryCounter
+from seed import seed_command
+
+
+# `flask bench` route benchmarks.
+#
+# For each data scale in BENCH_SCALES the database is re-seeded with
+# `flask seed --truncate` (so only run it against a local database), then every
+# route in ROUTES is requested --requests times through the test client. Per
+# route it records latency percentiles, SQL statements per request and the
+# peak Python memory of one extra traced request. Results are written as JSON;
+# with a baseline (--baseline, saved with --save-baseline) the command fails
+# when a route got slower or heavier than BENCH_REGRESSION_THRESHOLD allows,
+# or issues more statements than before.
+#
+# The page cache is bypassed and SQL echo turned off while measuring, so the
+# numbers are those of the views themselves.
+
+FORM = {
+    'city': 'Austin', 'state': 'TX', 'address': '1 Main St', 'phone': '512-555-0100',
+    'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://www.facebook.com/bench',
+    'website_link': 'https://bench.example.com', 'image_link': 'https://images.example.com/b.jpg',
+}
+
+
+def _venue_form(i, replay):
+    return dict(FORM, name='Bench Venue %d' % i)
+
+
+def _artist_form(i, replay):
+    return dict(FORM, name='Bench Artist %d' % i)
+
+
+def _show_form(i, replay):
+    return {
+        'venue_id': _pick(replay['venue_ids'], i),
+        'artist_id': _pick(replay['artist_ids'], i),
+        # a day apart, so the bookings never overlap
+        'start_time': (datetime(2031, 1, 1, 20) + timedelta(days=i)).isoformat(' '),
+        'duration_minutes': '120',
+    }
+
+
+def _search_form(i, replay):
+    return {'search_term': _pick(replay['search_terms'], i)}
+
+
+def _pick(values, i):
+    return values[i % len(values)]
+
+
+# (name, method, path, form data factory); path placeholders come from the
+# seed replay file, cycling through its popular-weighted ids
+ROUTES = [
+    ('home', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues_search', 'POST', '/venues/search', _search_form),
+    ('venue_detail', 'GET', '/venues/{venue_id}', None),
+    ('venue_edit_form', 'GET', '/venues/{venue_id}/edit', None),
+    ('venue_create', 'POST', '/venues/create', _venue_form),
+    ('venue_edit', 'POST', '/venues/{venue_id}/edit', _venue_form),
+    ('artists', 'GET', '/artists', None),
+    ('artists_search', 'POST', '/artists/search', _search_form),
+    ('artist_detail', 'GET', '/artists/{artist_id}', None),
+    ('artist_edit_form', 'GET', '/artists/{artist_id}/edit', None),
+    ('artist_create', 'POST', '/artists/create', _artist_form),
+    ('artist_edit', 'POST', '/artists/{artist_id}/edit', _artist_form),
+    ('shows', 'GET', '/shows', None),
+    ('show_create', 'POST', '/shows/create', _show_form),
+]
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _request(client, method, path, data):
+    if method == 'POST':
+        return client.post(path, data=data)
+    return client.get(path)
+
+
+def bench_route(client, route, replay, requests):
+    name, method, path, make_data = route
+    timings, queries, statuses = [], [], set()
+    for i in range(requests + 1):
+        target = path.format(venue_id=_pick(replay['venue_ids'], i), artist_id=_pick(replay['artist_ids'], i))
+        data = make_data(i, replay) if make_data else None
+        with QueryCounter(db.engine) as counter:
+            started = time.perf_counter()
+            response = _request(client, method, target, data)
+            elapsed = time.perf_counter() - started
+        if i == 0:
+            continue  # warm-up
+        timings.append(elapsed * 1000)
+        queries.append(counter.count)
+        statuses.add(response.status_code)
+
+    # memory separately: tracing slows every allocation down
+    tracemalloc.start()
+    target = path.format(venue_id=replay['venue_ids'][0], artist_id=replay['artist_ids'][0])
+    _request(client, method, target, make_data(requests + 1, replay) if make_data else None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "requests": requests,
+        "p50_ms": _percentile(timings, 50),
+        "p95_ms": _percentile(timings, 95),
+        "p99_ms": _percentile(timings, 99),
+        "mean_ms": sum(timings) / len(timings),
+        "queries_max": max(queries),
+        "queries_mean": sum(queries) / len(queries),
+        "peak_kb": peak / 1024.0,
+        "statuses": sorted(statuses),
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    # [message] for every regression of results against baseline
+    regressions = []
+    for scale, routes in results.items():
+        for name, current in routes.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if (current[key] > base[key] * (1 + threshold)
+                        and current[key] - base[key] > min_delta_ms):
+                    regressions.append('%s %s: %s %.2fms -> %.2fms' % (scale, name, key, base[key], current[key]))
+            if current['queries_max'] > base['queries_max']:
+                regressions.append('%s %s: queries %d -> %d' % (
+                    scale, name, base['queries_max'], current['queries_max']))
+            if current['peak_kb'] > base['peak_kb'] * (1 + threshold) and current['peak_kb'] - base['peak_kb'] > 64:
+                regressions.append('%s %s: peak memory %.0fKB -> %.0fKB' % (
+                    scale, name, base['peak_kb'], current['peak_kb']))
+    return regressions
+
+
+@click.command('bench')
+@click.option('--scale', 'scales', multiple=True,
+              help='Scale(s) from BENCH_SCALES to run [default: all].')
+@click.option('--requests', default=50, show_default=True, help='Timed requests per route.')
+@click.option('--route', 'only_routes', multiple=True, help='Only run these routes (by name).')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Results file [default: <instance>/bench/results-<time>.json].')
+@click.option('--baseline', type=click.Path(dir_okay=False),
+              help='Baseline to compare with [default: <instance>/bench/baseline.json].')
+@click.option('--save-baseline', is_flag=True, help='Store these results as the new baseline.')
+@click.option('--threshold', type=float, help='Allowed slowdown, e.g. 0.25 for 25%.')
+@click.option('--yes', is_flag=True, help='Do not ask before re-seeding the database.')
+@with_appcontext
+def bench_command(scales, requests, only_routes, output, baseline, save_baseline, threshold, yes):
+    """Benchmark every route at several data scales against a seeded database."""
+    config = current_app.config
+    all_scales = config['BENCH_SCALES']
+    scales = scales or list(all_scales)
+    unknown = set(scales) - set(all_scales)
+    if unknown:
+        raise click.BadParameter('unknown scale(s): %s' % ', '.join(sorted(unknown)))
+    routes = [r for r in ROUTES if not only_routes or r[0] in only_routes]
+    threshold = config['BENCH_REGRESSION_THRESHOLD'] if threshold is None else threshold
+    bench_dir = os.path.join(current_app.instance_path, 'bench')
+    baseline = baseline or os.path.join(bench_dir, 'baseline.json')
+    output = output or os.path.join(bench_dir, 'results-%s.json' % datetime.now().strftime('%Y%m%d-%H%M%S'))
+    if not yes:
+        click.confirm('This truncates Venue, Artist and Shows in %s. Continue?' % db.engine.url.database, abort=True)
+
+    ctx = click.get_current_context()
+    replay_path = os.path.join(bench_dir, 'replay.json')
+    client = current_app.test_client()
+    saved_backend, saved_echo = page_cache.backend, db.engine.echo
+    page_cache.backend, db.engine.echo = None, False
+    results = {}
+    try:
+        for scale in scales:
+            counts = all_scales[scale]
+            click.echo('== %s: %s' % (scale, ', '.join('%s=%d' % kv for kv in sorted(counts.items()))))
+            ctx.invoke(seed_command, truncate=True, replay_path=replay_path, **counts)
+            with open(replay_path) as f:
+                replay = json.load(f)
+            db.session.remove()
+            results[scale] = {}
+            for route in routes:
+                stats = bench_route(client, route, replay, requests)
+                results[scale][route[0]] = stats
+                click.echo('%-18s p50 %7.2fms  p95 %7.2fms  p99 %7.2fms  %3d queries  %7.0fKB  %s' % (
+                    route[0], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+                    stats['queries_max'], stats['peak_kb'], stats['statuses']))
+    finally:
+        page_cache.backend, db.engine.echo = saved_backend, saved_echo
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "requests": requests,
+            "results": results,
+        }, f, indent=2)
+    click.echo('results written to %s' % output)
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline)), exist_ok=True)
+        with open(baseline, 'w') as f:
+            json.dump({"results": results}, f, indent=2)
+        click.echo('baseline saved to %s' % baseline)
+        return
+    if not os.path.exists(baseline):
+        click.echo('no baseline at %s; run with --save-baseline to create one' % baseline)
+        return
+    with open(baseline) as f:
+        regressions = compare(results, json.load(f)['results'], threshold,
+                              config['BENCH_MIN_DELTA_MS'])
+    for message in regressions:
+        click.echo('REGRESSION %s' % message, err=True)
+    if regressions:
+        raise SystemExit(1)
+    click.echo('no regressions against %s (threshold %.0f%%)' % (baseline, threshold * 100))
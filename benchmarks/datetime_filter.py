@@ -0,0 +1,60 @@
+# Micro-benchmark: the old `datetime` Jinja filter against datefmt.
+#
+#   python benchmarks/datetime_filter.py [--shows 5000] [--distinct 500]
+#
+# The old filter is reproduced here as it was in app.py: views passed
+# str(start_time), which it re-parsed with dateutil before formatting.
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from datefmt import DateTimeFormatter  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--distinct', type=int, default=500,
+                        help='number of distinct start times among the shows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2030, 1, 1, 20, 0)
+    times = [start + timedelta(hours=i % args.distinct) for i in range(args.shows)]
+    strings = [str(t) for t in times]
+
+    formatter = DateTimeFormatter()
+    assert formatter.format_many(times, 'full') == [legacy_format_datetime(s, 'full') for s in strings]
+
+    cases = [
+        ('legacy filter (str + dateutil)', lambda: [legacy_format_datetime(s, 'full') for s in strings]),
+        ('datefmt, compiled pattern only', lambda: [formatter._format(t, 'full') for t in times]),
+        ('datefmt, cached (format_many)', lambda: formatter.format_many(times, 'full')),
+    ]
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print('%-34s %8.1f ms  %6.2f us/show  x%.1f' % (
+            name, best * 1000, best / args.shows * 1e6, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Benchmark: per-record cost of the shared validation rules.
+#
+#   python benchmarks/validation.py [--rows 1000000]
+#
+# Compares the old per-record checks (regex compiled per call, enum dicts
+# rebuilt per record, as VenueForm.validate did) with validation.validate_batch
+# over the same records held column-wise.
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import enums  # noqa: E402
+import validation  # noqa: E402
+
+
+def legacy_validate(record):
+    regex = re.compile('^(\\+[1-9][1-9]?)?[ ]?\\(?([0-9]{3})\\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
+    if not regex.match(record['phone']):
+        return False
+    if not set(record['genres']).issubset(dict(enums.Genre.choices()).keys()):
+        return False
+    if record['state'] not in dict(enums.State.choices()).keys():
+        return False
+    return True
+
+
+def make_columns(rows):
+    genres = sorted(validation.GENRES)
+    states = sorted(validation.STATES) + ['XX']
+    return {
+        'name': ['Venue %d' % i for i in range(rows)],
+        'city': ['City'] * rows,
+        'state': [states[i % len(states)] for i in range(rows)],
+        'address': ['%d Main St' % i for i in range(rows)],
+        'phone': ['(512) 555-%04d' % (i % 10000) if i % 97 else '555' for i in range(rows)],
+        'genres': [[genres[i % len(genres)], genres[(i * 7) % len(genres)]] for i in range(rows)],
+        'facebook_link': ['https://www.facebook.com/venue%d' % i for i in range(rows)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    columns = make_columns(args.rows)
+    records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    started = time.perf_counter()
+    legacy_valid = sum(map(legacy_validate, records))
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    record_masks = [validation.validate_record(validation.VENUE_RULES, r) for r in records]
+    per_record = time.perf_counter() - started
+
+    started = time.perf_counter()
+    masks = validation.validate_batch(validation.VENUE_RULES, columns, args.rows)
+    batch = time.perf_counter() - started
+
+    assert masks == record_masks
+    print('%d rows, %d valid' % (args.rows, masks.count(0)))
+    print('legacy form checks (3 rules)     %7.2fs  %6.2f us/record  (%d passed)' % (
+        legacy, legacy / args.rows * 1e6, legacy_valid))
+    for name, elapsed in (('validate_record (7 rules)', per_record),
+                          ('validate_batch, column-wise', batch)):
+        print('%-32s %7.2fs  %6.2f us/record' % (name, elapsed, elapsed / args.rows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import functools
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import make_response, render_template, request, session
+from sqlalchemy import event, select, update
+
+from models import Venue, Artist, Shows, VenueShowSummary, ArtistShowSummary, attributes_changed, db
+
+
+# Conditional GET (ETag / If-None-Match, Last-Modified / If-Modified-Since)
+# for the venue and artist pages and listings.
+#
+# Detail pages are validated before the view runs, with one primary key
+# lookup (queries.venue_version / artist_version): the row's version and
+# updated_at, plus refreshed_at of its summary row, which every write to its
+# shows updates. Renaming a venue or artist (or changing its image) changes
+# the pages of the artists or venues it played with, so that touches their
+# summary rows too (after_flush below). A page whose summary is behind the
+# clock (a show has started since it was refreshed) is not validated, since
+# its counts are computed live.
+#
+# Listings are cheap to query and expensive to render: their ETag is a hash
+# of the rows the template would be given, and a match skips the rendering.
+#
+# Every ETag also covers the templates and the static asset manifest, so a
+# deploy that changes either invalidates them; set ETAG_SALT to the release
+# to cover view changes too. Pages carrying flash messages are never
+# validated.
+
+class ConditionalGet:
+
+    def __init__(self):
+        self.enabled = False
+        self.salt = ''
+
+    def init_app(self, app, assets=None):
+        self.enabled = app.config.get('CONDITIONAL_GET_ENABLED', True)
+        digest = hashlib.sha1(app.config.get('ETAG_SALT', '').encode('utf-8'))
+        template_dir = os.path.join(app.root_path, app.template_folder)
+        for root, dirs, names in os.walk(template_dir):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, template_dir).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        if assets is not None:
+            digest.update(repr(sorted(assets.files.items())).encode('utf-8'))
+        self.salt = digest.hexdigest()
+        if not event.contains(db.session, 'after_flush', _touch_related):
+            event.listen(db.session, 'after_flush', _touch_related)
+
+    def _applies(self):
+        return self.enabled and request.method in ('GET', 'HEAD') and '_flashes' not in session
+
+    def _etag(self, parts):
+        return hashlib.sha1(('%s:%r' % (self.salt, parts)).encode('utf-8')).hexdigest()
+
+    def _not_modified(self, etag, last_modified):
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+        since = request.if_modified_since
+        return last_modified is not None and since is not None and last_modified <= since
+
+    def _finish(self, response, etag, last_modified):
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # caches may store the page but must revalidate it every time
+        response.cache_control.no_cache = True
+        return response
+
+    def validated(self, validator):
+        # validator(**view_args) -> (parts, last modified or None), or None
+        # when the page cannot be validated
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                if not self._applies():
+                    return view(**kwargs)
+                version = validator(**kwargs)
+                if version is None:
+                    return view(**kwargs)
+                parts, last_modified = version
+                etag = self._etag((request.endpoint, parts))
+                last_modified = _http_date(last_modified)
+                if self._not_modified(etag, last_modified):
+                    return self._finish(make_response('', 304), etag, last_modified)
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+                return self._finish(response, etag, last_modified)
+            return wrapper
+        return decorator
+
+    def render_template(self, template, **context):
+        # render_template, or 304 when the client has the page for this context
+        if not self._applies():
+            return render_template(template, **context)
+        etag = self._etag((template, sorted(context.items())))
+        if self._not_modified(etag, None):
+            return self._finish(make_response('', 304), etag, None)
+        return self._finish(make_response(render_template(template, **context)), etag, None)
+
+
+def _http_date(value):
+    # naive local time from the database -> UTC, whole seconds as in HTTP dates
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _touch_related(session, flush_context):
+    # a renamed venue changes the pages of the artists it lists, and vice versa
+    now = None
+    for obj in session.dirty:
+        if isinstance(obj, Venue) and attributes_changed(obj, 'name', 'image_link'):
+            summary, key, related = ArtistShowSummary, ArtistShowSummary.artist_id, \
+                select(Shows.artist_id).where(Shows.venue_id == obj.id)
+        elif isinstance(obj, Artist) and attributes_changed(obj, 'name', 'image_link'):
+            summary, key, related = VenueShowSummary, VenueShowSummary.venue_id, \
+                select(Shows.venue_id).where(Shows.artist_id == obj.id)
+        else:
+            continue
+        now = now or datetime.now()
+        session.connection().execute(update(summary).where(key.in_(related)).values(refreshed_at=now))
+
+
+conditional_get = ConditionalGet()
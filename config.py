@@ -1,5 +1,7 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Must be the same in every worker and across restarts, or sessions and CSRF
+# tokens stop validating; the development profile has a fallback.
+SECRET_KEY = os.environ.get('SECRET_KEY')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -10,6 +12,142 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
-SQLALCHEMY_ECHO = True
\ No newline at end of file
+SQLALCHEMY_ECHO = True
+
+# Connection pool (see dbpool.py); every value can be set per environment.
+# DB_POOLER=pgbouncer when DATABASE_URL points at a transaction-mode pooler.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+DB_POOLER = os.environ.get('DB_POOLER') or None
+
+# Raise on any relationship lazy load a view did not ask for (development only)
+RAISE_ON_LAZY_LOAD = DEBUG
+
+# Per-request SQL tracking (see querycount.py): None, 'log' or 'raise'.
+# Reports likely N+1 queries and requests over their view's @query_budget.
+QUERY_TRACKING = 'raise' if DEBUG else None
+N_PLUS_ONE_THRESHOLD = 3
+
+# Number of upcoming/past shows listed per section on venue and artist pages
+DETAIL_SHOWS_LIMIT = 6
+
+# Number of results per page on venue and artist search
+SEARCH_PAGE_SIZE = 20
+
+# Serve venue/artist name search from an in-process n-gram index instead of
+# Postgres (see search_index.py)
+SEARCH_INDEX_ENABLED = False
+
+# Filter venues and artists by genre on in-process NumPy arrays of their genre
+# masks instead of Postgres (see genre_masks.py; needs numpy)
+GENRE_MASKS_ENABLED = False
+
+# Rows per page on /venues, /artists and /shows (?per_page= is capped at the max)
+LISTING_PAGE_SIZE = 50
+LISTING_MAX_PAGE_SIZE = 200
+# A filtered listing matching at most this many rows (by its facet counts)
+# sorts the matches instead of walking the listing's index for them
+BROWSE_SORT_MATCHES = 1000
+
+# Rendered-page cache for venue and artist pages (see page_cache.py):
+# 'memory', 'filesystem', 'redis' or None to disable
+PAGE_CACHE_BACKEND = 'memory'
+PAGE_CACHE_TTL = 300
+PAGE_CACHE_MAX_ENTRIES = 1000
+PAGE_CACHE_BUCKET_SECONDS = 60
+PAGE_CACHE_DIR = os.path.join(basedir, 'instance', 'page_cache')
+PAGE_CACHE_REDIS_URL = 'redis://localhost:6379/0'
+# Locale and memoized-value cache size for the `datetime` template filter
+# (see datefmt.py)
+DATETIME_LOCALE = 'en'
+DATETIME_FORMAT_CACHE_SIZE = 4096
+
+# Export API (see api.py): rows fetched per server-side cursor round trip and
+# approximate size of each streamed chunk
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Prometheus metrics (see metrics.py). With several worker processes set
+# METRICS_DIR to a directory they share, so /metrics covers all of them.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 1.0
+
+# Conditional GET (see conditional.py): ETags on venue/artist pages and
+# listings. ETAG_SALT (e.g. the release id) invalidates them on deploy.
+CONDITIONAL_GET_ENABLED = True
+ETAG_SALT = os.environ.get('ETAG_SALT', '')
+
+# Fingerprinted, precompressed static files (see assets.py): built into
+# static/ASSETS_DIR by `flask assets build`, used for url_for('static') when
+# ASSETS_USE_MANIFEST is on and served with this max-age
+ASSETS_DIR = 'dist'
+ASSETS_USE_MANIFEST = True
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# `flask bench` (see bench.py): data scales to seed, and how much slower
+# (fraction, and at least BENCH_MIN_DELTA_MS) a route may get versus the baseline
+BENCH_SCALES = {
+    'small': {'venues': 100, 'artists': 200, 'shows': 2000},
+    'medium': {'venues': 5000, 'artists': 10000, 'shows': 200000},
+    'large': {'venues': 50000, 'artists': 100000, 'shows': 2000000},
+}
+BENCH_REGRESSION_THRESHOLD = 0.25
+BENCH_MIN_DELTA_MS = 2.0
+
+
+# Profiles, picked by create_app (app.py) from FYYUR_ENV. Each one overrides
+# the defaults above; everything not listed here is shared.
+
+
+class DevelopmentConfig:
+    SECRET_KEY = SECRET_KEY or 'development-only-secret-key'
+    # edited static files and templates show up without a rebuild or restart
+    ASSETS_USE_MANIFEST = False
+    CONDITIONAL_GET_ENABLED = False
+
+
+class ProductionConfig:
+    # SECRET_KEY has to come from the environment
+    DEBUG = False
+    SQLALCHEMY_ECHO = False
+    RAISE_ON_LAZY_LOAD = False
+    QUERY_TRACKING = None
+    # the cache must be shared by the workers so invalidations reach all of them,
+    # and /metrics must sum every worker
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'filesystem')
+    METRICS_DIR = METRICS_DIR or os.path.join(basedir, 'instance', 'metrics')
+
+
+class BenchmarkConfig(ProductionConfig):
+    # production settings in a single process, without the page cache
+    SECRET_KEY = SECRET_KEY or 'benchmark-only-secret-key'
+    PAGE_CACHE_BACKEND = None
+    METRICS_DIR = None
+
+
+class TestingConfig:
+    # pytest (tests/conftest.py), on a database of its own that the tests
+    # drop and rebuild, with the lazy load and query budget checks raising
+    SECRET_KEY = 'testing-only-secret-key'
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL')
+    SQLALCHEMY_ECHO = False
+    RAISE_ON_LAZY_LOAD = True
+    QUERY_TRACKING = 'raise'
+    PAGE_CACHE_BACKEND = None
+    METRICS_DIR = None
+    CONDITIONAL_GET_ENABLED = False
+    ASSETS_USE_MANIFEST = False
+
+
+profiles = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'benchmark': BenchmarkConfig,
+    'testing': TestingConfig,
+}
@@ -0,0 +1,75 @@
+import functools
+import threading
+from datetime import datetime
+
+
+# Date formatting for templates.
+#
+# babel.dates.format_datetime parses its pattern string and looks up the
+# locale on every call. Here each (format, locale) pair is compiled to a
+# DateTimePattern once, and formatted values are memoized in a bounded LRU
+# cache, since the same show times repeat across listings and detail pages.
+# Babel itself is imported on the first compile, not at startup.
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DateTimeFormatter:
+
+    def __init__(self, locale='en', cache_size=4096):
+        self.locale = locale
+        self.patterns = {}
+        self.lock = threading.Lock()
+        self.format = functools.lru_cache(maxsize=cache_size)(self._format)
+
+    def pattern(self, format, locale):
+        key = (format, locale)
+        compiled = self.patterns.get(key)
+        if compiled is None:
+            with self.lock:
+                compiled = self.patterns.get(key)
+                if compiled is None:
+                    from babel import Locale
+                    from babel.dates import parse_pattern
+                    compiled = (parse_pattern(FORMATS.get(format, format)), Locale.parse(locale))
+                    self.patterns[key] = compiled
+        return compiled
+
+    def _format(self, value, format='medium', locale=None):
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        pattern, locale = self.pattern(format, locale or self.locale)
+        return pattern.apply(value, locale)
+
+    def format_many(self, values, format='medium', locale=None):
+        return [self.format(value, format, locale) for value in values]
+
+    def format_shows(self, shows, format='medium', locale=None):
+        # adds start_time_display to each show dict in place
+        for show in shows:
+            show['start_time_display'] = self.format(show['start_time'], format, locale)
+        return shows
+
+    def stats(self):
+        info = self.format.cache_info()
+        return {
+            "patterns": len(self.patterns),
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
+
+    def init_app(self, app):
+        self.locale = app.config.get('DATETIME_LOCALE', 'en')
+        cache_size = app.config.get('DATETIME_FORMAT_CACHE_SIZE', 4096)
+        self.format = functools.lru_cache(maxsize=cache_size)(self._format)
+        app.jinja_env.filters['datetime'] = self.format
+
+
+formatter = DateTimeFormatter()
@@ -0,0 +1,132 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+# Connection pool settings and metrics.
+#
+# Pool size, overflow, timeout, recycle and pre-ping come from the DB_POOL_*
+# settings in config.py (each overridable from the environment). The pool is
+# an InstrumentedQueuePool, which times how long each checkout waited for a
+# connection; pool events keep the remaining counters. pool_metrics.snapshot()
+# adds the live checked-out/overflow numbers of the engine's pool.
+#
+# With DB_POOLER = 'pgbouncer' the app expects a transaction-mode pooler in
+# front of Postgres: it keeps no pool of its own (NullPool) and must not rely
+# on prepared statements or other session state surviving a transaction.
+# psycopg2 only ever sends plain statements, so nothing else needs to change.
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checkout_failures = 0
+            # wait_counts[i] counts waits <= WAIT_BUCKETS[i]; the last slot is +Inf
+            self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+            self.wait_sum = 0.0
+
+    def observe_wait(self, seconds):
+        with self.lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool=None):
+        with self.lock:
+            cumulative, buckets = 0, []
+            for bound, n in zip(WAIT_BUCKETS + ('+Inf',), self.wait_counts):
+                cumulative += n
+                buckets.append((bound, cumulative))
+            stats = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checkout_failures": self.checkout_failures,
+                "wait_seconds": {"buckets": buckets, "count": cumulative, "sum": self.wait_sum},
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.count('checkout_failures')
+            raise
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
+
+
+@event.listens_for(InstrumentedQueuePool, 'connect')
+@event.listens_for(NullPool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.count('connects')
+
+
+@event.listens_for(InstrumentedQueuePool, 'checkout')
+@event.listens_for(NullPool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.count('checkouts')
+
+
+@event.listens_for(InstrumentedQueuePool, 'checkin')
+@event.listens_for(NullPool, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.count('checkins')
+
+
+@event.listens_for(InstrumentedQueuePool, 'invalidate')
+@event.listens_for(NullPool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.count('invalidations')
+
+
+def engine_options(config):
+    if config.get('DB_POOLER') == 'pgbouncer':
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config['DB_POOL_SIZE'],
+        "max_overflow": config['DB_MAX_OVERFLOW'],
+        "pool_timeout": config['DB_POOL_TIMEOUT'],
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+        "pool_pre_ping": config['DB_POOL_PRE_PING'],
+    }
+
+
+def init_app(app):
+    # before the engine is first created; explicit engine options win
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
@@ -26,6 +26,25 @@ class Genre(enum.Enum):
     def choices(cls):
         return [(choice.name, choice.value) for choice in cls]
 
+    # Venue/Artist.genre_mask: bit i set for the i-th genre above, in
+    # declaration order, as the genre_mask_of() SQL function computes it.
+    # New genres go at the end, with a migration updating that function.
+    @property
+    def bit(self):
+        return GENRE_BITS[self.value]
+
+    @classmethod
+    def mask(cls, values):
+        # genre values -> mask; values that are not genres set no bit
+        mask = 0
+        for value in values or ():
+            mask |= GENRE_BITS.get(value, 0)
+        return mask
+
+
+# genre value -> its bit in Venue/Artist.genre_mask
+GENRE_BITS = {genre.value: 1 << i for i, genre in enumerate(Genre)}
+
 
 class State(enum.Enum):
     AL = 'AL'
@@ -0,0 +1,199 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (String, and_, cast, delete, event, false, func, inspect, literal, select, true, tuple_,
+                        union_all, update)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from models import (Venue, Artist, VenueShowSummary, ArtistShowSummary, VenueFacet, ArtistFacet,
+                    VenueFacetRollup, ArtistFacetRollup, db)
+
+
+# Maintenance of VenueFacet / ArtistFacet, the facet counts of the browse pages.
+#
+# A row counts the venues (artists) sharing one combination of state, city,
+# genre list, seeking flag and whether they have upcoming shows, so any facet
+# count under any filter is a sum over the matching rows (queries.py), and
+# there are far fewer of them than venues.
+#
+# Rows are recounted from Venue/Artist, never incremented, so they cannot
+# drift:
+# - a venue or artist written through the ORM recounts the rows of its old
+#   and new values (after_flush);
+# - summaries.py recounts the rows of the venues and artists whose show
+#   counts it changes, as that may change whether they have upcoming shows;
+# - `flask import` recounts the rows of the values it loaded;
+# - `flask facets rebuild` (and `flask summaries rebuild`) recounts them all.
+# Rows recounted to zero are kept, and skipped by the reads.
+#
+# The rollup rows (one genre each, '' for all) are recounted from the facet
+# rows right after them, for every (state, city, seeking) recounted.
+
+# owner -> (facet table, rollup table, summary table, summary key, seeking column)
+FACETS = {
+    Venue: (VenueFacet, VenueFacetRollup, VenueShowSummary, VenueShowSummary.venue_id,
+            Venue.looking_for_talent),
+    Artist: (ArtistFacet, ArtistFacetRollup, ArtistShowSummary, ArtistShowSummary.artist_id,
+             Artist.looking_for_venue),
+}
+
+
+def facet_key(owner):
+    # (state, city, genres, seeking) of an owner row, as stored in its facet
+    # table; the ix_*_facet indexes are on the first three
+    seeking = FACETS[owner][4]
+    return (func.coalesce(owner.state, ''), func.coalesce(owner.city, ''), owner.genres,
+            func.coalesce(seeking, false()))
+
+
+def has_upcoming(owner):
+    summary = FACETS[owner][2]
+    return func.coalesce(summary.upcoming_count, 0) > 0
+
+
+def facet_genres(facet):
+    # facet rows joined to this get a row per genre, and one more with genre
+    # '' (the rollup rows)
+    return func.unnest(func.array_append(facet.genres, literal('', String))).table_valued(
+        'genre').render_derived().lateral('genres')
+
+
+def cell(state, city, genres, seeking):
+    return state or '', city or '', tuple(genres or ()), bool(seeking)
+
+
+def _cells_query(cells):
+    # literal rows; genre lists are cast, since psycopg2 sends a list as text[]
+    # and varchar[] has no = with text[]
+    selects = [select(literal(state, String).label('state'), literal(city, String).label('city'),
+                      cast(list(genres), ARRAY(String)).label('genres'), literal(seeking).label('seeking'))
+               for state, city, genres, seeking in sorted(cells)]
+    return (union_all(*selects) if len(selects) > 1 else selects[0]).subquery('cells')
+
+
+def recount(owner, cells):
+    # recount the facet rows of the given (state, city, genres, seeking) cells
+    cells = {cell(*c) for c in cells}
+    if not cells:
+        return
+    facet, rollup, summary, key, _ = FACETS[owner]
+    connection = db.session.connection()
+    values = _cells_query(cells)
+    cell_columns = (values.c.state, values.c.city, values.c.genres, values.c.seeking)
+    # zeroing first locks the rows, so concurrent recounts of a row take turns
+    # and each one counts after the previous one committed
+    connection.execute(update(facet).where(
+        tuple_(facet.state, facet.city, facet.genres, facet.seeking).in_(select(*cell_columns))
+    ).values(count=0))
+
+    upcoming = has_upcoming(owner).label('upcoming')
+    source = select(*cell_columns, upcoming, func.count()).select_from(values).join(
+        owner, and_(*[a == b for a, b in zip(facet_key(owner), cell_columns)])
+    ).outerjoin(summary, key == owner.id).group_by(*cell_columns, upcoming)
+    stmt = insert(facet).from_select(['state', 'city', 'genres', 'seeking', 'upcoming', 'count'], source)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['state', 'city', 'genres', 'seeking', 'upcoming'],
+        set_={"count": stmt.excluded.count}))
+
+    keys = sorted({(state, city, seeking) for state, city, _, seeking in cells})
+    connection.execute(update(rollup).where(
+        tuple_(rollup.state, rollup.city, rollup.seeking).in_(keys)).values(count=0))
+    _fill_rollup(connection, facet, rollup, tuple_(facet.state, facet.city, facet.seeking).in_(keys))
+
+
+def _fill_rollup(connection, facet, rollup, *where):
+    genres = facet_genres(facet)
+    columns = (facet.state, facet.city, genres.c.genre, facet.seeking, facet.upcoming)
+    source = select(*columns, func.sum(facet.count)).select_from(facet).join(genres, true()).where(
+        *where).group_by(*columns)
+    stmt = insert(rollup).from_select(['state', 'city', 'genre', 'seeking', 'upcoming', 'count'], source)
+    return connection.execute(stmt.on_conflict_do_update(
+        index_elements=['state', 'city', 'genre', 'seeking', 'upcoming'],
+        set_={"count": stmt.excluded.count}))
+
+
+def recount_owners(owner, ids, might_flip=False):
+    # recount the rows of these venues (artists); with might_flip only of those
+    # whose upcoming show count is 0 or 1, the ones a single show can flip
+    summary, key = FACETS[owner][2:4]
+    query = select(*facet_key(owner)).distinct().where(owner.id.in_(ids))
+    if might_flip:
+        query = query.outerjoin(summary, key == owner.id).where(
+            func.coalesce(summary.upcoming_count, 0) <= 1)
+    recount(owner, db.session.connection().execute(query).all())
+
+
+def rebuild():
+    connection = db.session.connection()
+    rebuilt = 0
+    for owner, (facet, rollup, summary, key, _) in FACETS.items():
+        connection.execute(delete(rollup))
+        connection.execute(delete(facet))
+        columns = facet_key(owner) + (has_upcoming(owner),)
+        source = select(*columns, func.count()).select_from(owner).outerjoin(
+            summary, key == owner.id).group_by(*columns)
+        rebuilt += connection.execute(insert(facet).from_select(
+            ['state', 'city', 'genres', 'seeking', 'upcoming', 'count'], source)).rowcount
+        rebuilt += _fill_rollup(connection, facet, rollup).rowcount
+    db.session.commit()
+    return rebuilt
+
+
+def _attribute_values(obj, attributes, old):
+    state = inspect(obj)
+    values = []
+    for attribute in attributes:
+        history = state.attrs[attribute].history
+        if old and history.has_changes():
+            values.append(history.deleted[0] if history.deleted else None)
+        else:
+            values.append(getattr(obj, attribute))
+    return values
+
+
+def _apply_owner_changes(session, flush_context):
+    cells = {}
+    for obj in session.new | session.dirty | session.deleted:
+        owner = type(obj)
+        if owner not in FACETS:
+            continue
+        attributes = ('state', 'city', 'genres', FACETS[owner][4].key)
+        owner_cells = cells.setdefault(owner, set())
+        if obj in session.dirty:
+            if not any(inspect(obj).attrs[a].history.has_changes() for a in attributes):
+                continue
+            owner_cells.add(cell(*_attribute_values(obj, attributes, old=True)))
+        owner_cells.add(cell(*_attribute_values(obj, attributes, old=False)))
+    for owner, owner_cells in cells.items():
+        recount(owner, owner_cells)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    # no-op; registered with active_history, so that setting an expired
+    # attribute loads its old value and the old facet row gets recounted
+    pass
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _apply_owner_changes):
+        event.listen(db.session, 'after_flush', _apply_owner_changes)
+    for owner, (_, _, _, _, seeking) in FACETS.items():
+        for attribute in (owner.state, owner.city, owner.genres, seeking):
+            if not event.contains(attribute, 'set', _load_old_value):
+                event.listen(attribute, 'set', _load_old_value, active_history=True)
+    app.cli.add_command(facets_cli)
+
+
+@click.group('facets')
+def facets_cli():
+    """Browse facet count commands."""
+
+
+@facets_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recount every venue and artist facet row."""
+    started = time.perf_counter()
+    count = rebuild()
+    click.echo('rebuilt %d rows in %.2fs' % (count, time.perf_counter() - started))
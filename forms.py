@@ -1,11 +1,17 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, InputRequired, URL, NumberRange
 
-import enums
 import helperUtil
-from enums import Genre
+import validation
+
+
+def _check_rules(form, rules):
+    mask = validation.validate_record(rules, form.data)
+    for field, message in validation.errors(rules, mask):
+        getattr(form, field).errors.append(message)
+    return not mask
 
 
 class ShowForm(Form):
@@ -20,6 +26,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[InputRequired(), NumberRange(min=15, max=720)],
+        default=120
+    )
 
 
 class VenueForm(Form):
@@ -61,20 +72,10 @@ class VenueForm(Form):
     )
 
     def validate(self):
-        print("valifinfg ")
         rv = Form.validate(self)
         if not rv:
             return False
-        if not helperUtil.validate_phone(self.phone.data):
-            self.phone.errors.append('Invalid phone number.')
-            return False
-        if not set(self.genres.data).issubset(dict(enums.Genre.choices()).keys()):
-            self.genres.errors.append('Invalid genres.')
-            return False
-        if self.state.data not in dict(enums.State.choices()).keys():
-            self.state.errors.append('Invalid state.')
-            return False
-        return True
+        return _check_rules(self, validation.VENUE_RULES)
 
 class ArtistForm(Form):
     name = StringField(
@@ -114,17 +115,7 @@ class ArtistForm(Form):
     )
 
     def validate(self):
-        print("valifinfg ")
         rv = Form.validate(self)
         if not rv:
             return False
-        if not helperUtil.validate_phone(self.phone.data):
-            self.phone.errors.append('Invalid phone number.')
-            return False
-        # if not set(self.genres.data).issubset(dict(enums.Genre.choices()).keys()):
-        #     self.genres.errors.append('Invalid genres.')
-        #     return False
-        # if self.state.data not in dict(enums.State.choices()).keys():
-        #     self.state.errors.append('Invalid state.')
-        #     return False
-        return True
\ No newline at end of file
+        return _check_rules(self, validation.ARTIST_RULES)
@@ -0,0 +1,221 @@
+import threading
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select
+
+import queries
+from enums import Genre
+from models import Venue, Artist, db
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Optional in-process genre filter over every venue and artist.
+#
+# Each kind is two parallel NumPy arrays, the ids in ascending order and their
+# genre masks (Venue/Artist.genre_mask, see enums.Genre.mask), so "has all of
+# these genres" is (masks & wanted) == wanted and "has any of them" is
+# (masks & wanted) != 0, one vectorized pass over the whole catalogue with no
+# query to Postgres. 1M venues take 8MB.
+#
+# Like search_index.py, the arrays are built on the first request and kept
+# current from SQLAlchemy session hooks: masks written in a flush are
+# collected in session.info and applied once the transaction commits. Each
+# worker process holds its own copy and only sees its own writes (and none
+# made by `flask import`) until it restarts. When GENRE_MASKS_ENABLED is off,
+# NumPy is not installed, or the arrays are not built yet, queries.genre_matches
+# answers from Postgres instead. `flask genre-masks bench` compares the two.
+
+class MaskArray:
+
+    def __init__(self, ids=None, masks=None):
+        self.ids = ids if ids is not None else numpy.zeros(0, dtype=numpy.int32)
+        self.masks = masks if masks is not None else numpy.zeros(0, dtype=numpy.int32)
+        # rows in use; the arrays have room for more, so appends are amortized
+        self.size = len(self.ids)
+        self.lock = threading.RLock()
+
+    def set(self, doc_id, mask):
+        with self.lock:
+            i = int(numpy.searchsorted(self.ids[:self.size], doc_id))
+            if i < self.size and self.ids[i] == doc_id:
+                self.masks[i] = mask
+                return
+            if self.size == len(self.ids):
+                capacity = max(1024, 2 * self.size)
+                self.ids = numpy.resize(self.ids, capacity)
+                self.masks = numpy.resize(self.masks, capacity)
+            # new ids are the highest but for the odd out-of-order commit
+            self.ids[i + 1:self.size + 1] = self.ids[i:self.size]
+            self.masks[i + 1:self.size + 1] = self.masks[i:self.size]
+            self.ids[i], self.masks[i] = doc_id, mask
+            self.size += 1
+
+    def remove(self, doc_id):
+        with self.lock:
+            i = int(numpy.searchsorted(self.ids[:self.size], doc_id))
+            if i == self.size or self.ids[i] != doc_id:
+                return
+            self.ids[i:self.size - 1] = self.ids[i + 1:self.size]
+            self.masks[i:self.size - 1] = self.masks[i + 1:self.size]
+            self.size -= 1
+
+    def match(self, mask, match='all'):
+        # ids whose masks have all (any) of the bits of mask, ascending
+        with self.lock:
+            hits = self.masks[:self.size] & mask
+            hits = hits == mask if match == 'all' else hits != 0
+            return self.ids[:self.size][hits]
+
+    def stats(self):
+        with self.lock:
+            return {"rows": self.size, "memory_bytes": int(self.ids.nbytes + self.masks.nbytes)}
+
+
+class GenreMasks:
+
+    def __init__(self):
+        self.enabled = False
+        self.ready = False
+        self.build_seconds = None
+        self.arrays = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('GENRE_MASKS_ENABLED', False)
+        self.ready = False
+        self.arrays = {}
+        app.cli.add_command(genre_masks_cli)
+        if not self.enabled:
+            return
+        if numpy is None:
+            app.logger.warning('GENRE_MASKS_ENABLED is set but NumPy is not installed; '
+                               'genre filters go to Postgres')
+            self.enabled = False
+            return
+
+        @app.before_first_request
+        def build_genre_masks():
+            # already built when the WSGI entry point preloaded it (wsgi.py)
+            if self.ready:
+                return
+            self.build()
+            app.logger.info('genre masks built in %.3fs: %s', self.build_seconds, self.stats())
+
+        if not event.contains(db.session, 'after_flush', _collect_changes):
+            event.listen(db.session, 'after_flush', _collect_changes)
+            event.listen(db.session, 'after_commit', self._apply_changes)
+            event.listen(db.session, 'after_rollback', _discard_changes)
+
+    def build(self):
+        started = time.perf_counter()
+        arrays = {}
+        # plain rows from a server-side cursor; ORM rows take twice as long
+        connection = db.session.connection(execution_options={'stream_results': True})
+        for owner in (Venue, Artist):
+            rows = connection.execute(select(owner.id, owner.genre_mask).order_by(owner.id)).yield_per(10000)
+            pairs = numpy.fromiter(map(tuple, rows), dtype=[('id', numpy.int32), ('mask', numpy.int32)])
+            arrays[owner] = MaskArray(pairs['id'].copy(), pairs['mask'].copy())
+        self.arrays = arrays
+        self.build_seconds = time.perf_counter() - started
+        self.ready = True
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "build_seconds": self.build_seconds,
+            "venues": self.arrays[Venue].stats() if Venue in self.arrays else None,
+            "artists": self.arrays[Artist].stats() if Artist in self.arrays else None,
+        }
+
+    def _apply_changes(self, session):
+        changes = session.info.pop('genre_mask_changes', None)
+        if not changes or not self.ready:
+            return
+        for owner, doc_id, mask in changes:
+            if mask is None:
+                self.arrays[owner].remove(doc_id)
+            else:
+                self.arrays[owner].set(doc_id, mask)
+
+    def matches(self, owner, genres, match='all', limit=50):
+        if not (self.enabled and self.ready):
+            return queries.genre_matches(owner, genres, match, limit)
+        ids = self.arrays[owner].match(Genre.mask(genres), match)
+        return {"count": len(ids), "data": queries.names_by_id(owner, ids[:limit].tolist())}
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('genre_mask_changes', [])
+    for obj in session.new.union(session.dirty):
+        if isinstance(obj, (Venue, Artist)) and (
+                obj in session.new or inspect(obj).attrs.genres.history.has_changes()):
+            changes.append((type(obj), obj.id, Genre.mask(obj.genres)))
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            changes.append((type(obj), obj.id, None))
+
+
+def _discard_changes(session):
+    session.info.pop('genre_mask_changes', None)
+
+
+genre_masks = GenreMasks()
+
+
+@click.group('genre-masks')
+def genre_masks_cli():
+    """In-memory genre mask commands."""
+
+
+# single genres, pairs and triples, from common to rare
+BENCH_GENRES = (
+    ('Jazz',), ('Other',), ('Blues', 'Jazz'), ('Folk', 'Soul'),
+    ('Alternative', 'Blues', 'Jazz'), ('Funk', 'Punk', 'Reggae'),
+)
+
+
+def _best_ms(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+@genre_masks_cli.command('bench')
+@click.option('--repeat', default=5, show_default=True, help='Runs per filter; the best is reported.')
+@with_appcontext
+def bench_command(repeat):
+    """Time genre filters on the in-memory masks against Postgres."""
+    if numpy is None:
+        raise click.ClickException('NumPy is not installed')
+    genre_masks.build()
+    stats = genre_masks.stats()
+    click.echo('built in %.3fs: venues %s, artists %s' % (
+        stats['build_seconds'], stats['venues'], stats['artists']))
+    click.echo('%-8s %-5s %-34s %8s %11s %11s %11s' % (
+        'kind', 'match', 'genres', 'rows', 'numpy', 'sql array', 'sql mask'))
+    for owner, kind in ((Venue, 'venues'), (Artist, 'artists')):
+        array = genre_masks.arrays[owner]
+        for genres in BENCH_GENRES:
+            mask = Genre.mask(genres)
+            for match in ('all', 'any'):
+                in_memory, ids = _best_ms(lambda: array.match(mask, match), repeat)
+                by_array, array_count = _best_ms(
+                    lambda: queries.genre_match_count(owner, genres, match), repeat)
+                by_mask, mask_count = _best_ms(
+                    lambda: queries.genre_match_count(owner, genres, match, by_mask=True), repeat)
+                db.session.rollback()
+                if not len(ids) == array_count == mask_count:
+                    raise click.ClickException('%s %s %s: %d in memory, %d by array, %d by mask' % (
+                        kind, match, genres, len(ids), array_count, mask_count))
+                click.echo('%-8s %-5s %-34s %8d %9.2fms %9.2fms %9.2fms' % (
+                    kind, match, ', '.join(genres), len(ids), in_memory, by_array, by_mask))
@@ -0,0 +1,34 @@
+import glob
+import multiprocessing
+import os
+
+# gunicorn settings for `gunicorn wsgi:app`; every value can be set from the
+# environment. See wsgi.py for what the master does before forking.
+
+bind = os.environ.get('BIND', '0.0.0.0:%s' % os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# recycle workers now and then so slow leaks and cache growth stay bounded
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+os.environ.setdefault('FYYUR_ENV', 'production')
+
+
+def on_starting(server):
+    # metric files of a previous run would be summed into this one's
+    import config
+    directory = os.environ.get('METRICS_DIR') or config.ProductionConfig.METRICS_DIR
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    # the master disposed of its pool before forking (wsgi.py); make sure no
+    # worker ever reuses a connection it inherited
+    from models import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,4 +1,4 @@
-import re
+import validation
 
 states_choices = [
             ('AL', 'AL'),
@@ -75,7 +75,6 @@ genre_choices = [
             ('Other', 'Other')
         ]
 def validate_phone(phone_number):
-    regex = re.compile('^(\+[1-9][1-9]?)?[ ]?\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
-    return regex.match(phone_number)
+    return validation.PHONE_PATTERN.match(phone_number or '')
 # def printthis(output, o):
 #     print(output,o)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+import facets
+import summaries
+import validation
+from models import Venue, Artist, Shows, ImportCheckpoint, db
+from page_cache import page_cache
+
+
+# `flask import venues|artists|shows FILE` bulk loader.
+#
+# Rows are read from CSV (with a header) or NDJSON, validated a batch at a
+# time with the rules VenueForm/ArtistForm use (validation.py), and the valid
+# ones written with COPY, one transaction per batch. The batch's last source
+# line is saved in ImportCheckpoint in that same transaction, so after a
+# failure re-running the command continues after the last committed batch.
+#
+# In CSV files genres are separated by ';', as in the /api exports. Columns
+# the importer does not know, such as id and updated_at in an export, are
+# ignored.
+#
+# Shows that overlap another booking of their venue or artist (the exclusion
+# constraints on Shows.during) are skipped and counted as rejected.
+
+TRUE_VALUES = frozenset(('1', 'true', 't', 'yes', 'y', 'on'))
+# minutes, for show rows without a duration_minutes
+SHOW_DURATION = 120
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _genres(row):
+    value = row.get('genres')
+    if isinstance(value, list):
+        return [str(g).strip() for g in value if str(g).strip()]
+    return [g.strip() for g in (value or '').split(';') if g.strip()]
+
+
+def _flag(row, *fields):
+    for field in fields:
+        value = row.get(field)
+        if value is not None:
+            return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+    return False
+
+
+def _validated(rows, columns, rules, make_values):
+    # parse the batch, then check it column-wise against the form rules
+    lines = [line for line, _ in rows]
+    values = [make_values(row) for _, row in rows]
+    position = {name: i for i, name in enumerate(columns)}
+    masks = validation.validate_batch(rules, {
+        field: [v[position[field]] for v in values] for field, _, _ in rules}, len(values))
+    for line, mask, row_values in zip(lines, masks, values):
+        errors = ['%s: %s' % (field, message) for field, message in validation.errors(rules, mask)]
+        yield line, errors, row_values
+
+
+def _venue_values(rows):
+    return _validated(rows, IMPORTS['venues'][1], validation.VENUE_RULES, lambda row: (
+        _text(row, 'name'), _text(row, 'city'), _text(row, 'state'), _text(row, 'address'),
+        _text(row, 'phone'), _genres(row), _text(row, 'image_link'), _text(row, 'facebook_link'),
+        _text(row, 'website_link'), _flag(row, 'looking_for_talent', 'seeking_talent'),
+        _text(row, 'seeking_description')))
+
+
+def _artist_values(rows):
+    return _validated(rows, IMPORTS['artists'][1], validation.ARTIST_RULES, lambda row: (
+        _text(row, 'name'), _text(row, 'city'), _text(row, 'state'), _text(row, 'phone'),
+        _genres(row), _text(row, 'image_link'), _text(row, 'facebook_link'),
+        _text(row, 'website_link'), _flag(row, 'looking_for_venue', 'seeking_venue'),
+        _text(row, 'seeking_description')))
+
+
+def _show_values(rows):
+    parsed = []
+    for line, row in rows:
+        errors = []
+        ids = []
+        for field in ('venue_id', 'artist_id'):
+            try:
+                ids.append(int(_text(row, field)))
+            except ValueError:
+                errors.append('%s: must be an integer' % field)
+                ids.append(None)
+        try:
+            start_time = datetime.fromisoformat(_text(row, 'start_time'))
+        except ValueError:
+            errors.append('start_time: must be an ISO 8601 datetime')
+            start_time = None
+        # optional; exports made before shows had a duration lack it
+        duration = _text(row, 'duration_minutes') or str(SHOW_DURATION)
+        if not duration.isdigit() or not 0 < int(duration) <= 24 * 60:
+            errors.append('duration_minutes: must be a number of minutes up to a day')
+            duration = None
+        parsed.append((line, errors, (ids[0], ids[1], start_time, duration and int(duration))))
+
+    # one lookup per batch for the referenced venues and artists
+    venue_ids = {v[0] for _, _, v in parsed if v[0] is not None}
+    artist_ids = {v[1] for _, _, v in parsed if v[1] is not None}
+    known_venues = set(db.session.execute(select(Venue.id).where(Venue.id.in_(venue_ids))).scalars())
+    known_artists = set(db.session.execute(select(Artist.id).where(Artist.id.in_(artist_ids))).scalars())
+    for line, errors, values in parsed:
+        if values[0] is not None and values[0] not in known_venues:
+            errors.append('venue_id: no venue %d' % values[0])
+        if values[1] is not None and values[1] not in known_artists:
+            errors.append('artist_id: no artist %d' % values[1])
+        yield line, errors, values
+
+
+def _after_shows(values):
+    # COPY bypasses the ORM hooks that keep summaries and cached pages current
+    venue_ids = {v[0] for v in values}
+    artist_ids = {v[1] for v in values}
+    summaries.recompute(venue_ids, artist_ids)
+    page_cache.delete(['venue:%s' % i for i in venue_ids] + ['artist:%s' % i for i in artist_ids])
+
+
+def _after_owners(owner, kind, seeking):
+    # COPY bypasses the ORM hook that recounts the facet rows of written rows
+    def after_copy(values):
+        position = {name: i for i, name in enumerate(IMPORTS[kind][1])}
+        facets.recount(owner, {
+            facets.cell(v[position['state']], v[position['city']], v[position['genres']], v[position[seeking]])
+            for v in values})
+    return after_copy
+
+
+# kind -> (table, columns, row validator, hook run after each COPY, skip conflicts)
+IMPORTS = {
+    'venues': (Venue.__table__, (
+        'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link',
+        'website_link', 'looking_for_talent', 'seeking_description'), _venue_values,
+        _after_owners(Venue, 'venues', 'looking_for_talent'), False),
+    'artists': (Artist.__table__, (
+        'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+        'website_link', 'looking_for_venue', 'seeking_description'), _artist_values,
+        _after_owners(Artist, 'artists', 'looking_for_venue'), False),
+    'shows': (Shows.__table__, ('venue_id', 'artist_id', 'start_time', 'duration_minutes'),
+              _show_values, _after_shows, True),
+}
+
+
+def read_rows(path, fmt):
+    # yields (line number, dict) pairs
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    row = None
+                yield line, row if isinstance(row, dict) else {'_invalid': True}
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_field(value):
+    if value is None:
+        return None
+    if isinstance(value, list):
+        # array literal; elements quoted so commas and spaces survive
+        return '{%s}' % ','.join('"%s"' % v.replace('\\', '\\\\').replace('"', '\\"') for v in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def copy_rows(table, columns, values, skip_conflicts=False):
+    # returns the number of rows written. With skip_conflicts the rows go
+    # through a temporary staging table and an INSERT ... ON CONFLICT DO
+    # NOTHING, so rows violating a unique or exclusion constraint (a double
+    # booked show) are dropped instead of failing the whole COPY.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow([_copy_field(v) for v in row])
+    buffer.seek(0)
+    column_list = ', '.join('"%s"' % c for c in columns)
+    target = '_staging_%s' % table.name if skip_conflicts else table.name
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if skip_conflicts:
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS "%s" ON COMMIT DROP AS '
+                           'SELECT %s FROM "%s" WITH NO DATA' % (target, column_list, table.name))
+            cursor.execute('TRUNCATE "%s"' % target)
+        cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (target, column_list), buffer)
+        if not skip_conflicts:
+            return len(values)
+        cursor.execute('INSERT INTO "%s" (%s) SELECT %s FROM "%s" ON CONFLICT DO NOTHING' % (
+            table.name, column_list, column_list, target))
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def run_import(kind, path, fmt, batch_size=5000, restart=False, report=click.echo):
+    table, columns, validate, after_copy, skip_conflicts = IMPORTS[kind]
+    source = '%s:%s' % (kind, os.path.abspath(path))
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    if checkpoint is not None and restart:
+        db.session.delete(checkpoint)
+        db.session.commit()
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source, line=0, loaded=0, rejected=0)
+    elif checkpoint.line:
+        report('resuming after line %d (%d rows loaded, %d rejected so far)' % (
+            checkpoint.line, checkpoint.loaded, checkpoint.rejected))
+    resume_after = checkpoint.line
+
+    started = time.perf_counter()
+    loaded = rejected = 0
+    for batch in _batches(read_rows(path, fmt), batch_size):
+        batch = [(line, row) for line, row in batch if line > resume_after]
+        if not batch:
+            continue
+        valid = []
+        for line, errors, values in validate([(l, r) for l, r in batch if '_invalid' not in r]):
+            if errors:
+                rejected += 1
+                report('%s:%d: %s' % (path, line, '; '.join(errors)), err=True)
+            else:
+                valid.append(values)
+        for line, row in batch:
+            if '_invalid' in row:
+                rejected += 1
+                report('%s:%d: not a JSON object' % (path, line), err=True)
+
+        written = 0
+        if valid:
+            written = copy_rows(table, columns, valid, skip_conflicts)
+            if written < len(valid):
+                report('%s: %d rows up to line %d conflict with existing bookings, skipped' % (
+                    path, len(valid) - written, batch[-1][0]), err=True)
+                rejected += len(valid) - written
+            if after_copy:
+                after_copy(valid)
+        loaded += written
+        checkpoint.line = batch[-1][0]
+        checkpoint.loaded += written
+        checkpoint.rejected += len(batch) - written
+        db.session.add(checkpoint)
+        db.session.commit()
+
+        elapsed = time.perf_counter() - started
+        report('line %d: %d loaded, %d rejected, %.0f rows/s' % (
+            checkpoint.line, loaded, rejected, (loaded + rejected) / elapsed if elapsed else 0))
+
+    elapsed = time.perf_counter() - started
+    report('done: %d loaded, %d rejected in %.2fs (%.0f rows/s)' % (
+        loaded, rejected, elapsed, (loaded + rejected) / elapsed if elapsed else 0))
+    return loaded, rejected
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='File format; by default taken from the file extension.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per COPY and transaction.')
+@click.option('--restart', is_flag=True, help='Ignore a saved checkpoint and start from the top.')
+@with_appcontext
+def import_command(kind, path, fmt, batch_size, restart):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+    if fmt is None:
+        fmt = 'ndjson' if path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+    run_import(kind, path, fmt, batch_size, restart)
@@ -0,0 +1,316 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from flask import g, request, has_app_context, signals_available, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import dbpool
+from models import db
+
+
+# Request metrics in the Prometheus text format, served at /metrics.
+#
+# Each worker keeps its counters and histograms in memory; recording a value
+# is a dict lookup and a few additions under a lock. With METRICS_DIR set,
+# workers also dump their values to METRICS_DIR/metrics-<pid>.json (at most
+# every METRICS_FLUSH_SECONDS and at exit), and /metrics sums the files of all
+# workers, the way prometheus_client's multiprocess mode does. Gauges only
+# come from live workers. The counters and histograms of exited workers
+# (gunicorn recycles them after max_requests) are folded into
+# METRICS_DIR/metrics-exited.json, so counters never go backwards and the
+# directory holds one file per live worker plus that one; clear it when the
+# server is restarted.
+#
+# Template render times need blinker (Flask's signals); without it they are
+# not recorded.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'fyyur_http_requests_total': (
+        'counter', 'Requests by endpoint, method and status.', None),
+    'fyyur_http_request_duration_seconds': (
+        'histogram', 'Time to produce the response, by endpoint.', LATENCY_BUCKETS),
+    'fyyur_http_response_size_bytes': (
+        'histogram', 'Response body size, by endpoint (streamed responses excluded).', SIZE_BUCKETS),
+    'fyyur_template_render_seconds': (
+        'histogram', 'Template render time, by template.', LATENCY_BUCKETS),
+    'fyyur_sql_queries_per_request': (
+        'histogram', 'SQL statements executed per request, by endpoint.', QUERY_COUNT_BUCKETS),
+    'fyyur_sql_seconds_per_request': (
+        'histogram', 'Total SQL statement time per request, by endpoint.', LATENCY_BUCKETS),
+    # copied from dbpool.pool_metrics whenever the values are dumped
+    'fyyur_db_pool_connects_total': ('counter', 'New database connections.', None),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.', None),
+    'fyyur_db_pool_invalidations_total': ('counter', 'Connections invalidated (e.g. failed pre-ping).', None),
+    'fyyur_db_pool_checkout_failures_total': ('counter', 'Checkouts that timed out.', None),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections currently checked out.', None),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', None),
+    'fyyur_db_pool_wait_seconds': (
+        'histogram', 'Time a checkout waited for a connection.', dbpool.WAIT_BUCKETS),
+}
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> [value] for counters,
+        # [count per bucket..., count above the last bucket, sum] for histograms
+        self.values = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0]
+            values[0] += amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0] * (len(buckets) + 2)
+            values[bisect_left(buckets, value)] += 1
+            values[-1] += value
+
+    def dump(self):
+        with self.lock:
+            return [[name, list(labels), list(values)] for (name, labels), values in self.values.items()]
+
+
+registry = Registry()
+
+
+class Metrics:
+
+    def __init__(self):
+        self.directory = None
+        self.flush_seconds = 1.0
+        self.last_flush = 0.0
+        self.pool_entries = []
+
+    def init_app(self, app):
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_seconds = app.config.get('METRICS_FLUSH_SECONDS', 1.0)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+
+        app.before_request(_start_request)
+        app.after_request(self._end_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        if signals_available:
+            before_render_template.connect(_before_render, app)
+            template_rendered.connect(_after_render, app)
+        else:
+            app.logger.warning('blinker is not installed; template render times are not recorded')
+
+    def _end_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        registry.inc('fyyur_http_requests_total', (
+            ('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+        labels = (('endpoint', endpoint),)
+        registry.observe('fyyur_http_request_duration_seconds', labels, time.perf_counter() - started)
+        if not response.is_streamed and response.content_length is not None:
+            registry.observe('fyyur_http_response_size_bytes', labels, response.content_length)
+        count, seconds = g.pop('metrics_sql', (0, 0.0))
+        registry.observe('fyyur_sql_queries_per_request', labels, count)
+        registry.observe('fyyur_sql_seconds_per_request', labels, seconds)
+        if self.directory and time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+        return response
+
+    def _path(self):
+        return os.path.join(self.directory, 'metrics-%d.json' % os.getpid())
+
+    def dump(self):
+        # the pool can only be read inside an app context; keep the last values
+        if has_app_context():
+            self.pool_entries = _pool_entries(dbpool.pool_metrics.snapshot(db.engine.pool))
+        return registry.dump() + self.pool_entries
+
+    def flush(self):
+        if not self.directory:
+            return
+        self.last_flush = time.monotonic()
+        path = self._path()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.dump(), f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        # {(name, labels): values} summed over the live workers' files and
+        # the exited workers' totals
+        if not self.directory:
+            return {(name, tuple(map(tuple, labels))): values for name, labels, values in self.dump()}
+        self.flush()
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if pid.isdigit() and not _alive(int(pid)):
+                exited.append(path)
+        if exited:
+            self._fold_exited(exited)
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            _merge(merged, _read(path))
+        return merged
+
+    def _fold_exited(self, paths):
+        # add the exited workers' counters and histograms to metrics-exited.json
+        # and remove their files; under a lock, so that workers collecting at
+        # the same time fold each file once
+        with open(os.path.join(self.directory, 'metrics-exited.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            path = os.path.join(self.directory, 'metrics-exited.json')
+            totals = {}
+            _merge(totals, _read(path))
+            folded = [p for p in paths if os.path.exists(p)]
+            for worker_path in folded:
+                _merge(totals, [entry for entry in _read(worker_path)
+                                if METRICS[entry[0]][0] != 'gauge'])
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump([[name, list(labels), values] for (name, labels), values in totals.items()], f)
+            os.replace(tmp, path)
+            for worker_path in folded:
+                os.remove(worker_path)
+
+    def render(self):
+        lines = []
+        by_name = {}
+        for (name, labels), values in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((labels, values))
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, values in by_name.get(name, ()):
+                if kind in ('counter', 'gauge'):
+                    lines.append('%s%s %s' % (name, _labels(labels), _number(values[0])))
+                    continue
+                cumulative = 0
+                for bound, n in zip(buckets + ('+Inf',), values[:-1]):
+                    cumulative += n
+                    lines.append('%s_bucket%s %d' % (name, _labels(labels + (('le', _number(bound)),)), cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(labels), _number(values[-1])))
+                lines.append('%s_count%s %d' % (name, _labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = (0, 0.0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_start'].pop()
+    if has_app_context() and 'metrics_sql' in g:
+        count, seconds = g.metrics_sql
+        g.metrics_sql = (count + 1, seconds + time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start
+    # time so the stack doesn't grow on the pooled connection
+    if context.connection is not None:
+        context.connection.info.pop('metrics_query_start', None)
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('metrics_render_started', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    started = g.get('metrics_render_started')
+    if started:
+        registry.observe('fyyur_template_render_seconds', (('template', template.name or 'string'),),
+                         time.perf_counter() - started.pop())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _merge(merged, entries):
+    for name, labels, values in entries:
+        key = (name, tuple(map(tuple, labels)))
+        total = merged.get(key)
+        if total is None:
+            merged[key] = list(values)
+        else:
+            merged[key] = [a + b for a, b in zip(total, values)]
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in labels)
+
+
+def _pool_entries(stats):
+    entries = [['fyyur_db_pool_%s_total' % key, [], [stats[key]]]
+               for key in ('connects', 'checkouts', 'invalidations', 'checkout_failures')]
+    for key in ('checked_out', 'overflow'):
+        if key in stats:
+            entries.append(['fyyur_db_pool_%s' % key, [], [stats[key]]])
+    # cumulative buckets back to per-bucket counts, plus the sum
+    wait, previous, counts = stats['wait_seconds'], 0, []
+    for _, cumulative in wait['buckets']:
+        counts.append(cumulative - previous)
+        previous = cumulative
+    entries.append(['fyyur_db_pool_wait_seconds', [], counts + [wait['sum']]])
+    return entries
+
+
+metrics = Metrics()
@@ -0,0 +1,94 @@
+"""add show duration and booking constraints
+
+Revision ID: 2c6f9a4e8b15
+Revises: b7d2e5a1c803
+Create Date: 2026-10-18 16:24:05.402871
+
+"""
+import logging
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6f9a4e8b15'
+down_revision = 'b7d2e5a1c803'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+
+# Shows get a duration and a generated tsrange `during`, and two GiST
+# exclusion constraints (btree_gist provides = on integers) reject a show
+# overlapping another one of the same venue or the same artist. A GiST index
+# on `during` alone finds the shows overlapping a time slot, for the venue
+# availability search.
+#
+# Existing shows default to 120 minutes, cut short where the venue's or the
+# artist's next show starts earlier, so back-to-back bookings made before
+# durations existed stay valid. Shows starting less than a minute after
+# another one of the same venue or artist are real double bookings: the
+# upgrade stops and lists how many, unless run with
+#   flask db upgrade -x drop_double_bookings=1
+# which deletes the later show of each pair (then run `flask summaries rebuild`).
+#
+# Adding a stored generated column rewrites Shows under an exclusive lock.
+
+DURATION = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+DOUBLE_BOOKED = """
+    SELECT id FROM (
+        SELECT id,
+               start_time - lag(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS venue_gap,
+               start_time - lag(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS artist_gap
+        FROM "Shows"
+    ) gaps
+    WHERE venue_gap < interval '1 minute' OR artist_gap < interval '1 minute'
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Shows', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+
+    conn = op.get_bind()
+    double_booked = conn.execute(sa.text('SELECT count(*) FROM (%s) d' % DOUBLE_BOOKED)).scalar()
+    if double_booked:
+        if not context.get_x_argument(as_dictionary=True).get('drop_double_bookings'):
+            raise RuntimeError(
+                '%d shows start less than a minute after another show of the same venue or artist. '
+                'Resolve them, or rerun with -x drop_double_bookings=1 to delete them.' % double_booked)
+        conn.execute(sa.text('DELETE FROM "Shows" WHERE id IN (%s)' % DOUBLE_BOOKED))
+        log.warning('deleted %d double-booked shows; run `flask summaries rebuild`', double_booked)
+
+    op.execute("""
+        UPDATE "Shows" AS s SET duration_minutes = n.minutes
+        FROM (
+            SELECT id, floor(extract(epoch FROM least(
+                lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) - start_time,
+                lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) - start_time
+            )) / 60)::integer AS minutes
+            FROM "Shows"
+        ) n
+        WHERE n.id = s.id AND n.minutes < 120
+    """)
+
+    op.create_check_constraint('ck_Shows_duration_positive', 'Shows', 'duration_minutes > 0')
+    op.add_column('Shows', sa.Column('during', postgresql.TSRANGE(), sa.Computed(DURATION, persisted=True)))
+    op.create_exclude_constraint('ex_Shows_venue_booking', 'Shows',
+                                 ('venue_id', '='), ('during', '&&'), using='gist')
+    op.create_exclude_constraint('ex_Shows_artist_booking', 'Shows',
+                                 ('artist_id', '='), ('during', '&&'), using='gist')
+    op.create_index('ix_Shows_during', 'Shows', ['during'], postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('ix_Shows_during', table_name='Shows')
+    op.drop_constraint('ex_Shows_artist_booking', 'Shows')
+    op.drop_constraint('ex_Shows_venue_booking', 'Shows')
+    op.drop_column('Shows', 'during')
+    op.drop_constraint('ck_Shows_duration_positive', 'Shows')
+    op.drop_column('Shows', 'duration_minutes')
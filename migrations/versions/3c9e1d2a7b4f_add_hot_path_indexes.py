@@ -0,0 +1,44 @@
+"""add hot path indexes
+
+Revision ID: 3c9e1d2a7b4f
+Revises: f509952a4fff
+Create Date: 2026-10-18 09:12:41.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1d2a7b4f'
+down_revision = 'f509952a4fff'
+branch_labels = None
+depends_on = None
+
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block, so each
+# statement runs in an autocommit block; writes to the tables are not locked
+# while the indexes build. If a build is interrupted, Postgres leaves an
+# INVALID index behind which has to be dropped before re-running.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Shows_venue_id_start_time', 'Shows', ['venue_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_Shows_artist_id_start_time', 'Shows', ['artist_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_Venue_lower_name', 'Venue', [sa.text('lower(name)')],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_Artist_lower_name', 'Artist', [sa.text('lower(name)')],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Artist_lower_name', table_name='Artist', postgresql_concurrently=True)
+        op.drop_index('ix_Venue_lower_name', table_name='Venue', postgresql_concurrently=True)
+        op.drop_index('ix_Venue_city_state', table_name='Venue', postgresql_concurrently=True)
+        op.drop_index('ix_Shows_artist_id_start_time', table_name='Shows', postgresql_concurrently=True)
+        op.drop_index('ix_Shows_venue_id_start_time', table_name='Shows', postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""index the listing keys with NULL as ''
+
+Revision ID: 4e7a2b9c1f58
+Revises: d81c4f0a6b37
+Create Date: 2026-10-18 21:04:37.512906
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a2b9c1f58'
+down_revision = 'd81c4f0a6b37'
+branch_labels = None
+depends_on = None
+
+
+# The listings now page by coalesce(column, '') (queries._key_text), so that
+# rows with a NULL city, state or name are not skipped by the keyset
+# comparison. Their indexes are rebuilt on the same expressions, or the
+# planner would not use them.
+
+LISTING_INDEXES = (
+    ('ix_Venue_city_state_name_id', 'Venue', ('city', 'state', 'name')),
+    ('ix_Venue_state_city_name_id', 'Venue', ('state', 'city', 'name')),
+    ('ix_Artist_name_id', 'Artist', ('name',)),
+    ('ix_Artist_state_name_id', 'Artist', ('state', 'name')),
+)
+
+
+def _rebuild(key):
+    with op.get_context().autocommit_block():
+        for name, table, columns in LISTING_INDEXES:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "{0}"'.format(name))
+            op.execute('CREATE INDEX CONCURRENTLY "{0}" ON "{1}" ({2}, id)'.format(
+                name, table, ', '.join(map(key, columns))))
+
+
+def upgrade():
+    _rebuild(lambda column: "coalesce({0}, '')".format(column))
+
+
+def downgrade():
+    _rebuild(lambda column: column)
@@ -0,0 +1,38 @@
+"""add keyset pagination indexes
+
+Revision ID: 5f2a8c7e1d03
+Revises: 8d41f0b6c2e9
+Create Date: 2026-10-18 11:26:05.318442
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a8c7e1d03'
+down_revision = '8d41f0b6c2e9'
+branch_labels = None
+depends_on = None
+
+
+# One index per listing sort key, so every keyset page is a bounded index
+# range scan. Venue(city, state, name, id) supersedes Venue(city, state).
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_Venue_city_state_name_id', 'Venue', ['city', 'state', 'name', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_Venue_city_state', table_name='Venue', postgresql_concurrently=True)
+        op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_Shows_start_time_id', 'Shows', ['start_time', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_Shows_start_time_id', table_name='Shows', postgresql_concurrently=True)
+        op.drop_index('ix_Artist_name_id', table_name='Artist', postgresql_concurrently=True)
+        op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'],
+                        unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_Venue_city_state_name_id', table_name='Venue', postgresql_concurrently=True)
@@ -0,0 +1,90 @@
+"""add browse facet counts and browse indexes
+
+Revision ID: 6a3f8d2c9e71
+Revises: 2c6f9a4e8b15
+Create Date: 2026-10-18 18:12:44.308215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3f8d2c9e71'
+down_revision = '2c6f9a4e8b15'
+branch_labels = None
+depends_on = None
+
+
+# VenueFacet / ArtistFacet and their *Rollup tables hold the facet counts of
+# the browse pages (see facets.py) and are filled here from the current rows.
+# The facet key indexes use the same coalesce() expressions as facets.py, or
+# the planner would not match them. The state-leading indexes serve the
+# listings filtered by state.
+
+OWNERS = (
+    ('Venue', 'VenueFacet', 'VenueShowSummary', 'venue_id', 'looking_for_talent'),
+    ('Artist', 'ArtistFacet', 'ArtistShowSummary', 'artist_id', 'looking_for_venue'),
+)
+LISTING_INDEXES = (
+    ('ix_Venue_state_city_name_id', 'Venue', 'state, city, name, id'),
+    ('ix_Artist_state_name_id', 'Artist', 'state, name, id'),
+)
+
+
+def upgrade():
+    for owner, facet, summary, key, seeking in OWNERS:
+        op.create_table(
+            facet,
+            sa.Column('state', sa.String(length=120), nullable=False),
+            sa.Column('city', sa.String(length=120), nullable=False),
+            sa.Column('genres', sa.ARRAY(sa.String()), nullable=False),
+            sa.Column('seeking', sa.Boolean(), nullable=False),
+            sa.Column('upcoming', sa.Boolean(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('state', 'city', 'genres', 'seeking', 'upcoming'),
+        )
+        op.execute("""
+            INSERT INTO "{facet}" (state, city, genres, seeking, upcoming, count)
+            SELECT coalesce(o.state, ''), coalesce(o.city, ''), o.genres, coalesce(o.{seeking}, false),
+                   coalesce(s.upcoming_count, 0) > 0, count(*)
+            FROM "{owner}" o LEFT JOIN "{summary}" s ON s.{key} = o.id
+            GROUP BY 1, 2, 3, 4, 5
+        """.format(owner=owner, facet=facet, summary=summary, key=key, seeking=seeking))
+
+        op.create_table(
+            facet + 'Rollup',
+            sa.Column('state', sa.String(length=120), nullable=False),
+            sa.Column('city', sa.String(length=120), nullable=False),
+            sa.Column('genre', sa.String(), nullable=False),
+            sa.Column('seeking', sa.Boolean(), nullable=False),
+            sa.Column('upcoming', sa.Boolean(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('state', 'city', 'genre', 'seeking', 'upcoming'),
+        )
+        op.execute("""
+            INSERT INTO "{facet}Rollup" (state, city, genre, seeking, upcoming, count)
+            SELECT state, city, genre, seeking, upcoming, sum(count)
+            FROM "{facet}", unnest(array_append(genres, '')) AS genre
+            GROUP BY 1, 2, 3, 4, 5
+        """.format(facet=facet))
+
+    with op.get_context().autocommit_block():
+        for owner, _, _, _, _ in OWNERS:
+            op.execute('CREATE INDEX CONCURRENTLY "ix_{0}_genres" ON "{0}" USING gin (genres)'.format(owner))
+            op.execute('CREATE INDEX CONCURRENTLY "ix_{0}_facet" ON "{0}" '
+                       "(coalesce(state, ''), coalesce(city, ''), genres)".format(owner))
+        for name, table, columns in LISTING_INDEXES:
+            op.execute('CREATE INDEX CONCURRENTLY "{0}" ON "{1}" ({2})'.format(name, table, columns))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in LISTING_INDEXES:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "{0}"'.format(name))
+        for owner, _, _, _, _ in OWNERS:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_{0}_facet"'.format(owner))
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_{0}_genres"'.format(owner))
+    for _, facet, _, _, _ in OWNERS:
+        op.drop_table(facet + 'Rollup')
+        op.drop_table(facet)
@@ -0,0 +1,44 @@
+"""add trigram search
+
+Revision ID: 8d41f0b6c2e9
+Revises: 3c9e1d2a7b4f
+Create Date: 2026-10-18 10:03:17.561920
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0b6c2e9'
+down_revision = '3c9e1d2a7b4f'
+branch_labels = None
+depends_on = None
+
+
+# fyyur_search_text() folds name, city, state and genres into one lower-cased
+# string. It has to be IMMUTABLE to be indexable; array_to_string is only
+# STABLE in general but is deterministic for text arrays. queries.py calls it
+# with exactly these arguments so the planner matches the index expression.
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_search_text(
+            name varchar, city varchar, state varchar, genres varchar[])
+        RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT lower(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' ||
+                         coalesce(state, '') || ' ' || coalesce(array_to_string(genres, ' '), ''))
+        $$
+    """)
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY "ix_Venue_search_trgm" ON "Venue" '
+                   'USING gin (fyyur_search_text(name, city, state, genres) gin_trgm_ops)')
+        op.execute('CREATE INDEX CONCURRENTLY "ix_Artist_search_trgm" ON "Artist" '
+                   'USING gin (fyyur_search_text(name, city, state, genres) gin_trgm_ops)')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_Artist_search_trgm"')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS "ix_Venue_search_trgm"')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_search_text(varchar, varchar, varchar, varchar[])')
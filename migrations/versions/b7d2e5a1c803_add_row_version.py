@@ -0,0 +1,32 @@
+"""add row version
+
+Revision ID: b7d2e5a1c803
+Revises: e93a5d17b4c2
+Create Date: 2026-10-18 15:10:42.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e5a1c803'
+down_revision = 'e93a5d17b4c2'
+branch_labels = None
+depends_on = None
+
+
+# version is the mapper's version_id_col: the ORM increments it on every
+# UPDATE. A constant default is stored in the catalog, so this rewrites nothing.
+
+TABLES = ('Venue', 'Artist', 'Shows')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'version')
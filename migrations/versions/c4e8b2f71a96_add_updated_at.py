@@ -0,0 +1,40 @@
+"""add updated_at
+
+Revision ID: c4e8b2f71a96
+Revises: a17c3e94d5b2
+Create Date: 2026-10-18 14:02:37.514206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8b2f71a96'
+down_revision = 'a17c3e94d5b2'
+branch_labels = None
+depends_on = None
+
+
+# updated_at backs the export API's updated_since filter. now() is stable, so
+# Postgres stores the default in the catalog instead of rewriting the tables.
+
+TABLES = ('Venue', 'Artist', 'Shows')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'),
+                                       nullable=False))
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index('ix_%s_updated_at' % table, table, ['updated_at'],
+                            unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index('ix_%s_updated_at' % table, table_name=table, postgresql_concurrently=True)
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,53 @@
+"""add genre masks
+
+Revision ID: d81c4f0a6b37
+Revises: 6a3f8d2c9e71
+Create Date: 2026-10-18 21:05:37.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81c4f0a6b37'
+down_revision = '6a3f8d2c9e71'
+branch_labels = None
+depends_on = None
+
+
+# Venue and Artist get genre_mask, their genres as bits: a stored generated
+# column, so every insert, update and COPY keeps it current, and adding it
+# fills it. genre_mask_of() sets bit i for the i-th genre of enums.Genre
+# (GENRES below, in that order) and ignores other values; it has to be
+# IMMUTABLE to be used by a generated column, so a new genre means a new
+# migration replacing it and recomputing the columns.
+#
+# Adding a stored generated column rewrites the table under an exclusive lock.
+
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+)
+
+
+def upgrade():
+    genres = ', '.join("'%s'" % genre for genre in GENRES)
+    op.execute("""
+        CREATE FUNCTION genre_mask_of(genres varchar[]) RETURNS integer
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT coalesce(bit_or(1 << (array_position(ARRAY[%s]::varchar[], genre) - 1)), 0)
+            FROM unnest(genres) AS genre
+        $$
+    """ % genres)
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('genre_mask', sa.Integer(),
+                                       sa.Computed('genre_mask_of(genres)', persisted=True)))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_column(table, 'genre_mask')
+    op.execute('DROP FUNCTION genre_mask_of(varchar[])')
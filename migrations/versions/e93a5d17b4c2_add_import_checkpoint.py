@@ -0,0 +1,31 @@
+"""add import checkpoint
+
+Revision ID: e93a5d17b4c2
+Revises: c4e8b2f71a96
+Create Date: 2026-10-18 14:41:09.883521
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a5d17b4c2'
+down_revision = 'c4e8b2f71a96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ImportCheckpoint',
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('line', sa.Integer(), nullable=False),
+    sa.Column('loaded', sa.Integer(), nullable=False),
+    sa.Column('rejected', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('ImportCheckpoint')
@@ -1,6 +1,33 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSRANGE
+from sqlalchemy.orm import raiseload
 
 db = SQLAlchemy()
+
+
+# Development aid: every ORM query gets raiseload('*'), so a relationship that
+# a view did not load explicitly raises instead of silently emitting a query.
+# Loads that the query itself asked for (selectinload etc.) are unaffected.
+def _raiseload_all(orm_execute_state):
+    if (orm_execute_state.is_select
+            and not orm_execute_state.is_column_load
+            and not orm_execute_state.is_relationship_load):
+        orm_execute_state.statement = orm_execute_state.statement.options(
+            raiseload('*', sql_only=True))
+
+
+def raise_on_lazy_load():
+    if not event.contains(db.session, 'do_orm_execute', _raiseload_all):
+        event.listen(db.session, 'do_orm_execute', _raiseload_all)
+
+
+# For flush hooks: whether any of the attributes of obj has pending changes.
+def attributes_changed(obj, *attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -15,10 +42,31 @@ class Venue(db.Model):
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
     genres = db.Column(db.ARRAY(db.String), nullable=False)
+    # genres as bits (enums.Genre.mask), kept by Postgres (genre_mask_of())
+    genre_mask = db.Column(db.Integer, db.Computed('genre_mask_of(genres)', persisted=True))
     website_link = db.Column(db.String(500))
     looking_for_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(1000))
-    shows = db.relationship('Shows', backref='venue', lazy="joined", cascade="all, delete")
+    shows = db.relationship('Shows', backref='venue', cascade="all, delete")
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+    # row version, incremented by the ORM on every UPDATE (version_id_col)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __table_args__ = (
+        # the listing keys as queries.py spells them (NULL as '')
+        db.Index('ix_Venue_city_state_name_id', db.func.coalesce(city, ''), db.func.coalesce(state, ''),
+                 db.func.coalesce(name, ''), id),
+        # the same order within one state, for the browse page filtered by state
+        db.Index('ix_Venue_state_city_name_id', db.func.coalesce(state, ''), db.func.coalesce(city, ''),
+                 db.func.coalesce(name, ''), id),
+        db.Index('ix_Venue_lower_name', db.func.lower(name)),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        # genre filters (genres @> ...) on the browse page
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        # the facet key as facets.py spells it, for the facet recounts
+        db.Index('ix_Venue_facet', db.func.coalesce(state, ''), db.func.coalesce(city, ''), genres),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
 
 class Artist(db.Model):
@@ -30,6 +78,7 @@ class Artist(db.Model):
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genre_mask = db.Column(db.Integer, db.Computed('genre_mask_of(genres)', persisted=True))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -37,7 +86,20 @@ class Artist(db.Model):
     website_link = db.Column(db.String(500))
     looking_for_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(1000))
-    shows = db.relationship('Shows', backref='artist', lazy="joined", cascade="all, delete")
+    shows = db.relationship('Shows', backref='artist', cascade="all, delete")
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+    # row version, incremented by the ORM on every UPDATE (version_id_col)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __table_args__ = (
+        db.Index('ix_Artist_lower_name', db.func.lower(name)),
+        db.Index('ix_Artist_name_id', db.func.coalesce(name, ''), id),
+        db.Index('ix_Artist_state_name_id', db.func.coalesce(state, ''), db.func.coalesce(name, ''), id),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_facet', db.func.coalesce(state, ''), db.func.coalesce(city, ''), genres),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -47,4 +109,106 @@ class Shows(db.Model):
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, server_default='120')
+    # [start_time, end) as a range, for the booking constraints and availability
+    during = db.Column(TSRANGE, db.Computed(
+        "tsrange(start_time, start_time + duration_minutes * interval '1 minute')", persisted=True))
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+    # row version, incremented by the ORM on every UPDATE (version_id_col)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __table_args__ = (
+        db.Index('ix_Shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Shows_start_time_id', 'start_time', 'id'),
+        db.Index('ix_Shows_updated_at', 'updated_at'),
+        db.CheckConstraint('duration_minutes > 0', name='ck_Shows_duration_positive'),
+        # no venue or artist booked twice at once (GiST, needs btree_gist)
+        ExcludeConstraint(('venue_id', '='), ('during', '&&'), using='gist', name='ex_Shows_venue_booking'),
+        ExcludeConstraint(('artist_id', '='), ('during', '&&'), using='gist', name='ex_Shows_artist_booking'),
+        # the shows overlapping a time slot, whatever the venue (queries.available_venues)
+        db.Index('ix_Shows_during', 'during', postgresql_using='gist'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+
+
+# Show counts per venue and per artist, maintained by summaries.py: updated in
+# the same transaction as every Shows write, and periodically for rows whose
+# next show has started (`flask summaries refresh`).
+class VenueShowSummary(db.Model):
+    __tablename__ = 'VenueShowSummary'
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0)
+    past_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, index=True)
+    last_show_time = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+class ArtistShowSummary(db.Model):
+    __tablename__ = 'ArtistShowSummary'
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0)
+    past_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, index=True)
+    last_show_time = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+# Facet counts of the browse pages, maintained by facets.py: the number of
+# venues (artists) per combination of state, city, genres, seeking flag and
+# whether they have upcoming shows. Missing state or city is ''.
+#
+# The *Rollup tables hold the same counts per single genre instead of per
+# genre list, plus a genre '' row counting every venue (artist) of the cell
+# once: far fewer rows, enough for the counts when no genre is selected.
+class VenueFacet(db.Model):
+    __tablename__ = 'VenueFacet'
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genres = db.Column(db.ARRAY(db.String), primary_key=True)
+    seeking = db.Column(db.Boolean, primary_key=True)
+    upcoming = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArtistFacet(db.Model):
+    __tablename__ = 'ArtistFacet'
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genres = db.Column(db.ARRAY(db.String), primary_key=True)
+    seeking = db.Column(db.Boolean, primary_key=True)
+    upcoming = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VenueFacetRollup(db.Model):
+    __tablename__ = 'VenueFacetRollup'
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String, primary_key=True)
+    seeking = db.Column(db.Boolean, primary_key=True)
+    upcoming = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArtistFacetRollup(db.Model):
+    __tablename__ = 'ArtistFacetRollup'
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String, primary_key=True)
+    seeking = db.Column(db.Boolean, primary_key=True)
+    upcoming = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 
+# Progress of `flask import` per source file: the last source line whose batch
+# was committed, written in the same transaction as that batch.
+class ImportCheckpoint(db.Model):
+    __tablename__ = 'ImportCheckpoint'
+    source = db.Column(db.String, primary_key=True)
+    line = db.Column(db.Integer, nullable=False, default=0)
+    loaded = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
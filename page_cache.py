@@ -0,0 +1,265 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, make_response, session as flask_session
+from sqlalchemy import event, select
+
+from models import Venue, Artist, Shows, attributes_changed, db
+
+
+# Rendered-page cache for the venue and artist detail pages.
+#
+# An entry is keyed by entity ("venue:12") and stores the HTML together with
+# the time bucket it was rendered in. Which shows count as upcoming or past
+# depends on the clock, so an entry from an older bucket is treated as a miss;
+# PAGE_CACHE_BUCKET_SECONDS bounds how late a show moves from upcoming to
+# past on a cached page.
+#
+# Entries are dropped when a commit touches what the page shows: the entity
+# itself, one of its shows, or the name/image of a venue or artist it lists.
+# The keys are collected in after_flush and deleted in after_commit. The
+# memory backend is per process, so with several workers use the filesystem
+# or redis backend to have invalidations reach every worker.
+
+class MemoryBackend:
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def size(self):
+        return len(self.entries)
+
+
+class FileSystemBackend:
+    # one pickle per entry; file mtime doubles as the LRU clock
+
+    def __init__(self, directory, max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.expirations = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self.delete([key])
+            self.expirations += 1
+            return None
+        os.utime(path)
+        return value
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump((time.time() + ttl, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.directory) if not e.name.endswith('.tmp')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def size(self):
+        return sum(1 for e in os.scandir(self.directory) if not e.name.endswith('.tmp'))
+
+
+class RedisBackend:
+    # Any server speaking the Redis protocol. TTL is enforced by the server and
+    # LRU eviction by its maxmemory-policy (allkeys-lru).
+
+    def __init__(self, url, prefix='fyyur:page:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.expirations = 0
+
+    @property
+    def evictions(self):
+        return self.client.info('stats').get('evicted_keys', 0)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, int(ttl), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+class PageCache:
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+        self.bucket_seconds = 60
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_BACKEND')
+        max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 1000)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        self.bucket_seconds = app.config.get('PAGE_CACHE_BUCKET_SECONDS', 60)
+        if backend == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(
+                app.config.get('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache')),
+                max_entries)
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['PAGE_CACHE_REDIS_URL'])
+        else:
+            self.backend = None
+            return
+
+        # create_app may run more than once per process
+        if not event.contains(db.session, 'after_flush', _collect_keys):
+            event.listen(db.session, 'after_flush', _collect_keys)
+            event.listen(db.session, 'after_commit', self._invalidate)
+            event.listen(db.session, 'after_rollback', _discard_keys)
+
+    def cached(self, kind, id_arg):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                # paged show sections and pages carrying flash messages are
+                # rendered per request
+                if self.backend is None or request.args or flask_session.get('_flashes'):
+                    return view(**kwargs)
+                key = '%s:%s' % (kind, kwargs[id_arg])
+                bucket = int(time.time() // self.bucket_seconds)
+                entry = self.backend.get(key)
+                if entry is not None and entry[0] == bucket:
+                    self.hits += 1
+                    response = make_response(entry[1])
+                    response.headers['X-Page-Cache'] = 'HIT'
+                    return response
+                self.misses += 1
+                response = make_response(view(**kwargs))
+                if response.status_code == 200:
+                    self.backend.set(key, (bucket, response.get_data(as_text=True)), self.ttl)
+                response.headers['X-Page-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        if self.backend is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def delete(self, keys):
+        # for writes that bypass the session hooks (bulk import)
+        if keys and self.backend is not None:
+            self.backend.delete(keys)
+            self.invalidations += len(keys)
+
+    def _invalidate(self, session):
+        keys = session.info.pop('page_cache_keys', None)
+        if keys and self.backend is not None:
+            self.backend.delete(keys)
+            self.invalidations += len(keys)
+
+
+def _collect_keys(session, flush_context):
+    keys = session.info.setdefault('page_cache_keys', set())
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Shows):
+            keys.add('venue:%s' % obj.venue_id)
+            keys.add('artist:%s' % obj.artist_id)
+        elif isinstance(obj, Venue):
+            keys.add('venue:%s' % obj.id)
+            # artist pages list the venues they played at
+            if obj in session.dirty and attributes_changed(obj, 'name', 'image_link'):
+                artist_ids = session.execute(
+                    select(Shows.artist_id).where(Shows.venue_id == obj.id).distinct()).scalars()
+                keys.update('artist:%s' % artist_id for artist_id in artist_ids)
+        elif isinstance(obj, Artist):
+            keys.add('artist:%s' % obj.id)
+            if obj in session.dirty and attributes_changed(obj, 'name', 'image_link'):
+                venue_ids = session.execute(
+                    select(Shows.venue_id).where(Shows.artist_id == obj.id).distinct()).scalars()
+                keys.update('venue:%s' % venue_id for venue_id in venue_ids)
+
+
+def _discard_keys(session):
+    session.info.pop('page_cache_keys', None)
+
+
+page_cache = PageCache()
@@ -0,0 +1,495 @@
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import String, func, select, true, tuple_
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+import facets
+from enums import Genre
+from models import Venue, Artist, Shows, VenueShowSummary, ArtistShowSummary, db
+
+
+# Read-side queries for the listing and detail pages. Each function returns
+# plain dicts shaped the way the templates read them, so the views never touch
+# ORM relationships (and never trigger per-row lazy loads).
+
+
+#  Loading profiles
+#  ----------------------------------------------------------------
+# Relationships are not eagerly loaded by default. Views that load an entity
+# through the ORM pass one of these to .options(), spelling out which columns
+# and relationships they use; touching anything else that needs SQL raises
+# when RAISE_ON_LAZY_LOAD is set.
+
+VENUE_DETAIL = (
+    load_only(Venue.id, Venue.name, Venue.genres, Venue.address, Venue.city, Venue.state,
+              Venue.phone, Venue.website_link, Venue.looking_for_talent,
+              Venue.seeking_description, Venue.image_link),
+    raiseload(Venue.shows),
+)
+ARTIST_DETAIL = (
+    load_only(Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state, Artist.phone,
+              Artist.website_link, Artist.facebook_link, Artist.looking_for_venue,
+              Artist.seeking_description, Artist.image_link),
+    raiseload(Artist.shows),
+)
+# edit forms read and write every column, but never the shows
+VENUE_FORM = (raiseload(Venue.shows),)
+ARTIST_FORM = (raiseload(Artist.shows),)
+# deleting a venue cascades to its shows, which need their keys loaded
+VENUE_DELETE = (
+    # the version columns are checked by the DELETEs; the facet columns say
+    # which facet counts to recount (facets.py)
+    load_only(Venue.id, Venue.version, Venue.state, Venue.city, Venue.genres, Venue.looking_for_talent),
+    selectinload(Venue.shows).load_only(Shows.id, Shows.venue_id, Shows.artist_id, Shows.version),
+)
+
+
+# Upcoming counts on listings and search come from the summary tables kept by
+# summaries.py; venues and artists that never had a show have no row there.
+def _upcoming_count(summary):
+    return func.coalesce(summary.upcoming_count, 0)
+
+
+#  Listings
+#  ----------------------------------------------------------------
+# Listings are paged by keyset: the page after (or before) a cursor holding
+# the sort key of the last (or first) row shown. With an index on the sort
+# key each page costs the same no matter how deep into the table it is.
+#
+# Text columns of a key may be NULL, and a row comparison with a NULL in it
+# is neither true nor false: the row would fall out of every page. Keys use
+# _key_text(column) instead, which is '' for NULL (so those rows sort first),
+# and the listing indexes are on the same expressions.
+
+def _key_text(column):
+    return func.coalesce(column, '').label(column.key)
+
+
+def keyset_page(query, key, after=None, before=None, per_page=50, sort=False):
+    # sort=True orders by expressions of the key that no index provides, so
+    # the planner finds the matching rows by other means and sorts them: far
+    # cheaper than walking the key's index when few rows match a filter
+    order = [c.concat('') if isinstance(c.type, String) else c + 0 for c in key] if sort else key
+    if before:
+        query = query.filter(tuple_(*key) < tuple(decode_cursor(before, key)))
+        rows = query.order_by(*[c.desc() for c in order]).limit(per_page + 1).all()
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if after:
+            query = query.filter(tuple_(*key) > tuple(decode_cursor(after, key)))
+        rows = query.order_by(*order).limit(per_page + 1).all()
+        has_prev, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    def cursor(row):
+        return encode_cursor([row._mapping[c] for c in key])
+
+    pager = {
+        "prev": cursor(rows[0]) if rows and has_prev else None,
+        "next": cursor(rows[-1]) if rows and has_next else None,
+    }
+    return rows, pager
+
+
+def venue_areas(after=None, before=None, per_page=50, filters=None, sort=False):
+    # One page of venues in (city, state, name, id) order, with their upcoming
+    # show counts, grouped into areas. Venues of an area are adjacent in that
+    # order, so grouping needs no second pass; an area split across pages is
+    # continued on the next one. Within one state that is (state, city, name,
+    # id) order, which ix_Venue_state_city_name_id serves.
+    filters = filters or {}
+    city, state, name = _key_text(Venue.city), _key_text(Venue.state), _key_text(Venue.name)
+    key = (state, city, name, Venue.id) if filters.get('state') else (city, state, name, Venue.id)
+    query = db.session.query(
+        *key, _upcoming_count(VenueShowSummary).label('num_upcoming_shows')
+    ).outerjoin(VenueShowSummary, VenueShowSummary.venue_id == Venue.id)
+    if filters:
+        query = query.filter(*_owner_filters(Venue, filters))
+    rows, pager = keyset_page(query, key, after, before, per_page, sort)
+
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda r: (r.city, r.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": v.id,
+                "name": v.name,
+                "num_upcoming_shows": v.num_upcoming_shows
+            } for v in venues]
+        })
+    return areas, pager
+
+
+def artists_page(after=None, before=None, per_page=50, filters=None, sort=False):
+    filters = filters or {}
+    state, name = _key_text(Artist.state), _key_text(Artist.name)
+    key = (state, name, Artist.id) if filters.get('state') else (name, Artist.id)
+    query = db.session.query(*key)
+    if filters:
+        if 'upcoming' in filters:
+            query = query.outerjoin(ArtistShowSummary, ArtistShowSummary.artist_id == Artist.id)
+        query = query.filter(*_owner_filters(Artist, filters))
+    rows, pager = keyset_page(query, key, after, before, per_page, sort)
+    return [{"id": r.id, "name": r.name} for r in rows], pager
+
+
+def shows_page(after=None, before=None, per_page=50):
+    key = (Shows.start_time, Shows.id)
+    query = db.session.query(
+        *key,
+        Shows.venue_id,
+        Venue.name.label('venue_name'),
+        Shows.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).join(Venue, Shows.venue_id == Venue.id).join(Artist, Shows.artist_id == Artist.id)
+    rows, pager = keyset_page(query, key, after, before, per_page)
+    return [{
+        "venue_id": r.venue_id,
+        "venue_name": r.venue_name,
+        "artist_id": r.artist_id,
+        "artist_name": r.artist_name,
+        "artist_image_link": r.artist_image_link,
+        "start_time": r.start_time
+    } for r in rows], pager
+
+
+#  Browse facets
+#  ----------------------------------------------------------------
+# The listings filter by genres (all of those given), state, city, seeking
+# flag and upcoming shows: filters is a dict with any of the keys genres,
+# state, city, seeking and upcoming.
+#
+# The counts of every facet value within the filtered set are sums over the
+# facet rows kept by facets.py, in one grouping-sets pass: over the rollup
+# rows (one genre each) when no genre is selected, else over the facet rows
+# holding every selected genre, unnested. Genre '' stands for a whole row, so
+# the other facets and the total sum only those.
+
+def _facet_filters(columns, filters):
+    state, city, genres, seeking, upcoming = columns
+    clauses = []
+    if filters.get('genres'):
+        clauses.append(genres.op('@>')(db.cast(filters['genres'], Venue.genres.type)))
+    if filters.get('state'):
+        clauses.append(state == filters['state'])
+    if filters.get('city'):
+        clauses.append(city == filters['city'])
+    for column, name in ((seeking, 'seeking'), (upcoming, 'upcoming')):
+        if name in filters:
+            clauses.append(column if filters[name] else ~column)
+    return clauses
+
+
+def _owner_filters(owner, filters):
+    # the filters on Venue/Artist; an upcoming filter needs the summary joined.
+    # state and city are compared as the listing keys and facet keys spell
+    # them, so the state-leading listing index serves a state filter
+    summary, _, seeking = facets.FACETS[owner][2:]
+    columns = (func.coalesce(owner.state, ''), func.coalesce(owner.city, ''), owner.genres,
+               func.coalesce(seeking, False),
+               summary.next_show_time.isnot(None))
+    return _facet_filters(columns, filters)
+
+
+def _facet_counts(owner, filters):
+    facet, rollup = facets.FACETS[owner][:2]
+    if filters.get('genres'):
+        genres = facets.facet_genres(facet)
+        rows = select(facet.state, facet.city, genres.c.genre, facet.seeking, facet.upcoming,
+                      facet.count).select_from(facet).join(genres, true()).where(
+            facet.count > 0,
+            *_facet_filters((facet.state, facet.city, facet.genres, facet.seeking, facet.upcoming),
+                            filters)).subquery()
+    else:
+        rows = select(rollup).where(
+            rollup.count > 0,
+            *_facet_filters((rollup.state, rollup.city, None, rollup.seeking, rollup.upcoming),
+                            filters)).subquery()
+    sets = [rows.c.genre, rows.c.state, rows.c.seeking, rows.c.upcoming]
+    # cities are listed within the selected state
+    if filters.get('state'):
+        sets.append(rows.c.city)
+    query = select(*sets, func.sum(rows.c.count), func.sum(rows.c.count).filter(rows.c.genre == '')
+                   ).group_by(func.grouping_sets(*sets))
+
+    counts = {"genres": [], "state": [], "city": [], "seeking": {}, "upcoming": {}, "total": 0}
+    for row in db.session.execute(query):
+        genre, state, seeking, upcoming = row[:4]
+        city = row[4] if len(row) > 6 else None
+        count, once = row[-2:]
+        if genre == '':
+            counts["total"] = count
+        elif genre is not None:
+            counts["genres"].append((genre, count))
+        elif state is not None:
+            if state:
+                counts["state"].append((state, once))
+        elif seeking is not None:
+            counts["seeking"][seeking] = once
+        elif upcoming is not None:
+            counts["upcoming"][upcoming] = once
+        elif city:
+            counts["city"].append((city, once))
+    counts["genres"].sort(key=lambda c: (-c[1], c[0]))
+    counts["state"].sort()
+    counts["city"].sort()
+    return counts
+
+
+def venue_facets(filters):
+    return _facet_counts(Venue, filters)
+
+
+def artist_facets(filters):
+    return _facet_counts(Artist, filters)
+
+
+#  Cursors
+#  ----------------------------------------------------------------
+# A cursor is the sort key of the last row on a page, serialized as url-safe
+# base64 JSON. Datetimes are carried as ISO strings and restored using the
+# type of the column they were taken from.
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    # raises ValueError on anything that is not a cursor for these columns
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+    return [datetime.fromisoformat(v) if isinstance(c.type, db.DateTime) else v
+            for v, c in zip(values, columns)]
+
+
+#  Detail pages
+#  ----------------------------------------------------------------
+
+def _show_counts(summary, key, owner_column, owner_id, now):
+    row = db.session.query(
+        summary.upcoming_count, summary.past_count, summary.next_show_time
+    ).filter(key == owner_id).first()
+    if row is None:
+        return 0, 0
+    if row.next_show_time is None or row.next_show_time > now:
+        return row.upcoming_count, row.past_count
+    # a show has started since the summary was refreshed; count live instead
+    return db.session.query(
+        func.count(Shows.id).filter(Shows.start_time > now),
+        func.count(Shows.id).filter(Shows.start_time <= now),
+    ).filter(owner_column == owner_id).one()
+
+
+def _shows_page(owner_column, owner_id, counterpart, prefix, upcoming, cursor, limit, now):
+    # One bounded page of a venue's (or artist's) shows, joined to the name and
+    # image of the artist (or venue) in the same statement. Upcoming shows run
+    # ascending from now, past shows descending; (start_time, id) is the
+    # keyset so shows starting at the same time page deterministically.
+    key = (Shows.start_time, Shows.id)
+    query = db.session.query(
+        Shows.id,
+        Shows.start_time,
+        counterpart.id.label(prefix + '_id'),
+        counterpart.name.label(prefix + '_name'),
+        counterpart.image_link.label(prefix + '_image_link'),
+    ).join(
+        counterpart, getattr(Shows, prefix + '_id') == counterpart.id
+    ).filter(owner_column == owner_id)
+
+    if upcoming:
+        query = query.filter(Shows.start_time > now).order_by(*key)
+        if cursor:
+            query = query.filter(tuple_(*key) > tuple(decode_cursor(cursor, key)))
+    else:
+        query = query.filter(Shows.start_time <= now).order_by(*[c.desc() for c in key])
+        if cursor:
+            query = query.filter(tuple_(*key) < tuple(decode_cursor(cursor, key)))
+
+    # one extra row tells us whether there is a further page
+    rows = query.limit(limit + 1).all()
+    more = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        more = encode_cursor([rows[-1].start_time, rows[-1].id])
+
+    shows = [{
+        prefix + '_id': r[2],
+        prefix + '_name': r[3],
+        prefix + '_image_link': r[4],
+        "start_time": r.start_time
+    } for r in rows]
+    return shows, more
+
+
+def _detail_shows(summary, key, owner_column, owner_id, counterpart, prefix,
+                  upcoming_after, past_before, limit, now):
+    now = now or datetime.now()
+    upcoming_count, past_count = _show_counts(summary, key, owner_column, owner_id, now)
+    upcoming_shows, upcoming_more = _shows_page(
+        owner_column, owner_id, counterpart, prefix, True, upcoming_after, limit, now)
+    past_shows, past_more = _shows_page(
+        owner_column, owner_id, counterpart, prefix, False, past_before, limit, now)
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": past_count,
+        "upcoming_shows_count": upcoming_count,
+        "past_shows_more": past_more,
+        "upcoming_shows_more": upcoming_more,
+    }
+
+
+def _page_version(owner, summary, key, owner_id, now):
+    # validator of a detail page (see conditional.py), or None when the page
+    # does not exist or its summary is behind the clock
+    row = db.session.query(
+        owner.version, owner.updated_at, summary.refreshed_at, summary.next_show_time
+    ).outerjoin(summary, key == owner.id).filter(owner.id == owner_id).first()
+    if row is None:
+        return None
+    if row.next_show_time is not None and row.next_show_time <= (now or datetime.now()):
+        return None
+    last_modified = max(t for t in (row.updated_at, row.refreshed_at) if t is not None)
+    return (row.version, row.updated_at, row.refreshed_at), last_modified
+
+
+def venue_version(venue_id, now=None):
+    return _page_version(Venue, VenueShowSummary, VenueShowSummary.venue_id, venue_id, now)
+
+
+def artist_version(artist_id, now=None):
+    return _page_version(Artist, ArtistShowSummary, ArtistShowSummary.artist_id, artist_id, now)
+
+
+def venue_shows(venue_id, upcoming_after=None, past_before=None, limit=6, now=None):
+    return _detail_shows(VenueShowSummary, VenueShowSummary.venue_id, Shows.venue_id, venue_id,
+                         Artist, 'artist', upcoming_after, past_before, limit, now)
+
+
+def artist_shows(artist_id, upcoming_after=None, past_before=None, limit=6, now=None):
+    return _detail_shows(ArtistShowSummary, ArtistShowSummary.artist_id, Shows.artist_id, artist_id,
+                         Venue, 'venue', upcoming_after, past_before, limit, now)
+
+
+#  Search
+#  ----------------------------------------------------------------
+# Substring search over name, city, state and genres, served by the trigram
+# GIN index on fyyur_search_text() (see migration 8d41f0b6c2e9). Matches are
+# ranked by how well the term matches part of the name, and each page carries
+# its upcoming-show counts and the total hit count from the same statement.
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search(model, summary, key, term, page, per_page):
+    term = (term or '').strip().lower()
+    search_text = func.fyyur_search_text(model.name, model.city, model.state, model.genres)
+
+    rows = db.session.query(
+        model.id,
+        model.name,
+        _upcoming_count(summary).label('num_upcoming_shows'),
+        func.count().over().label('total'),
+    ).outerjoin(
+        summary, key == model.id
+    ).filter(
+        search_text.like('%' + _escape_like(term) + '%')
+    ).order_by(
+        func.word_similarity(term, func.lower(model.name)).desc(), model.name, model.id
+    ).limit(per_page).offset((page - 1) * per_page).all()
+
+    total = rows[0].total if rows else 0
+    return {
+        "count": total,
+        "data": [{
+            "id": r.id,
+            "name": r.name,
+            "num_upcoming_shows": r.num_upcoming_shows
+        } for r in rows],
+        "page": page,
+        "prev_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if page * per_page < total else None,
+    }
+
+
+def search_venues(term, page=1, per_page=20):
+    return _search(Venue, VenueShowSummary, VenueShowSummary.venue_id, term, page, per_page)
+
+
+def search_artists(term, page=1, per_page=20):
+    return _search(Artist, ArtistShowSummary, ArtistShowSummary.artist_id, term, page, per_page)
+
+
+#  Availability
+#  ----------------------------------------------------------------
+# Venues with no show overlapping [start, end). The shows overlapping the slot
+# come from the GiST index on Shows.during (or, per venue, from the one on
+# (venue_id, during) behind ex_Shows_venue_booking), so the cost follows the
+# number of shows in the slot, not the size of Shows.
+
+def available_venues(state, start, end, genre=None, city=None, limit=50):
+    booked = db.session.query(Shows.id).filter(
+        Shows.venue_id == Venue.id,
+        Shows.during.op('&&')(func.tsrange(start, end)),
+    ).exists()
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.genres, Venue.looking_for_talent
+    ).filter(Venue.state == state, ~booked)
+    if city:
+        query = query.filter(Venue.city == city)
+    if genre:
+        query = query.filter(Venue.genres.op('@>')(db.cast([genre], Venue.genres.type)))
+    return [{
+        "id": r.id,
+        "name": r.name,
+        "city": r.city,
+        "state": r.state,
+        "genres": r.genres,
+        "looking_for_talent": r.looking_for_talent,
+    } for r in query.order_by(Venue.name, Venue.id).limit(limit)]
+
+
+#  Genre matches
+#  ----------------------------------------------------------------
+# Venues or artists with all (any) of the given genres, in id order: the
+# Postgres side of genre_masks.py. The genres arrays are matched with @> (&&)
+# through their GIN indexes; by_mask tests the genre_mask bits instead, which
+# no index serves.
+
+def _genre_match(owner, genres, match, by_mask=False):
+    if by_mask:
+        mask = Genre.mask(genres)
+        hits = owner.genre_mask.op('&')(mask)
+        return hits == mask if match == 'all' else hits != 0
+    wanted = db.cast(list(genres), owner.genres.type)
+    return owner.genres.op('@>' if match == 'all' else '&&')(wanted)
+
+
+def genre_match_count(owner, genres, match='all', by_mask=False):
+    return db.session.query(func.count()).filter(_genre_match(owner, genres, match, by_mask)).scalar()
+
+
+def genre_matches(owner, genres, match='all', limit=50):
+    rows = db.session.query(owner.id, owner.name, func.count().over().label('total')).filter(
+        _genre_match(owner, genres, match)).order_by(owner.id).limit(limit).all()
+    return {"count": rows[0].total if rows else 0, "data": [{"id": r.id, "name": r.name} for r in rows]}
+
+
+def names_by_id(owner, ids):
+    if not ids:
+        return []
+    rows = db.session.query(owner.id, owner.name).filter(owner.id.in_(ids)).order_by(owner.id)
+    return [{"id": r.id, "name": r.name} for r in rows]
@@ -0,0 +1,186 @@
+import os
+import re
+import traceback
+
+import click
+from flask import current_app, g, has_app_context, request
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from models import Venue, Artist, db
+
+
+# Per-route SQL statement budgets and N+1 detection.
+#
+# Views declare the most statements they may issue with @query_budget(n).
+# With QUERY_TRACKING set to 'log' or 'raise' every statement of a request is
+# recorded, and after the request:
+# - statements with the same SQL but different parameters, repeated at least
+#   N_PLUS_ONE_THRESHOLD times, are reported as a likely N+1 together with the
+#   line of our code that issued the first of them;
+# - a request over its view's budget is logged, or fails with
+#   QueryBudgetExceeded in 'raise' mode.
+#
+# `flask check-query-counts` requests every budgeted page and search route of
+# a live database and fails when one goes over budget. tests/test_query_budgets.py
+# checks every budgeted route, writes included, on a fixture database.
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(max_queries):
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryCounter:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+IN_LIST = re.compile(r'IN \((?:%\(\w+\)s(?:, )?)+\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def _shape(statement):
+    # expanded IN lists of any length share one shape
+    return IN_LIST.sub('IN (...)', WHITESPACE.sub(' ', statement).strip())
+
+
+def _origin():
+    # innermost frame of our own code outside this module
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith('<'):
+            continue
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(ROOT) and filename != os.path.abspath(__file__)
+                and 'site-packages' not in filename):
+            return '%s:%d in %s' % (os.path.relpath(filename, ROOT), frame.lineno, frame.name)
+    return 'unknown'
+
+
+class QueryTracker:
+
+    def __init__(self):
+        self.mode = None
+        self.threshold = 3
+
+    def init_app(self, app):
+        self.mode = app.config.get('QUERY_TRACKING')
+        self.threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 3)
+        app.cli.add_command(check_query_counts)
+        if not self.mode:
+            return
+        app.before_request(_start_tracking)
+        app.after_request(self._check_request)
+        if not event.contains(Engine, 'before_cursor_execute', _record_statement):
+            event.listen(Engine, 'before_cursor_execute', _record_statement)
+
+    def repeated_shapes(self, statements):
+        # [(shape, count, origin)] for shapes run with threshold+ distinct parameters
+        seen = {}
+        for shape, parameters, origin in statements:
+            entry = seen.get(shape)
+            if entry is None:
+                entry = seen[shape] = [set(), 0, origin]
+            entry[0].add(repr(parameters))
+            entry[1] += 1
+        return [(shape, count, origin) for shape, (params, count, origin) in seen.items()
+                if count >= self.threshold and len(params) > 1]
+
+    def _check_request(self, response):
+        statements = g.pop('query_tracking', None)
+        if statements is None:
+            return response
+        route = '%s %s' % (request.method, request.path)
+        for shape, count, origin in self.repeated_shapes(statements):
+            current_app.logger.warning('possible N+1 in %s: %d x %s (first from %s)',
+                                       route, count, shape[:200], origin)
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and len(statements) > budget:
+            report = '%s issued %d SQL statements (budget %d):\n%s' % (
+                route, len(statements), budget,
+                '\n'.join('  %s  %s' % (origin, shape[:200]) for shape, _, origin in statements))
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(report)
+            current_app.logger.warning(report)
+        return response
+
+
+def _start_tracking():
+    g.query_tracking = []
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_tracking' in g:
+        g.query_tracking.append((_shape(statement), parameters, _origin()))
+
+
+query_tracker = QueryTracker()
+
+
+def budgeted_routes(app):
+    # (method, rule, budget) for every view declaring a budget
+    for rule in app.url_map.iter_rules():
+        budget = getattr(app.view_functions[rule.endpoint], 'query_budget', None)
+        if budget is None:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            yield method, rule, budget
+
+
+@click.command('check-query-counts')
+@with_appcontext
+def check_query_counts():
+    """Request each budgeted route and fail if it exceeds its query budget."""
+    ids = {
+        "venue_id": db.session.query(func.min(Venue.id)).scalar(),
+        "artist_id": db.session.query(func.min(Artist.id)).scalar(),
+    }
+    db.session.remove()
+    if None in ids.values():
+        raise click.ClickException('needs at least one venue and one artist in the database')
+
+    app = current_app._get_current_object()
+    client = app.test_client()
+    failed = False
+    for method, rule, max_queries in budgeted_routes(app):
+        if method != 'GET' and not rule.rule.endswith('/search'):
+            # writes are checked by the tests, not against a live database
+            continue
+        path = rule.build({arg: ids[arg] for arg in rule.arguments})[1]
+        with QueryCounter(db.engine) as counter:
+            try:
+                if method == 'POST':
+                    status = client.post(path, data={'search_term': 'a'}).status_code
+                else:
+                    status = client.get(path).status_code
+            except QueryBudgetExceeded as e:
+                click.echo(str(e), err=True)
+                status = 500
+        ok = status < 400 and counter.count <= max_queries
+        failed = failed or not ok
+        click.echo('%-4s %-6s %-24s %3d queries (max %d) %s' % (
+            'ok' if ok else 'FAIL', method, path, counter.count, max_queries, status))
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,219 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+import queries
+from models import Venue, Artist, db
+
+
+# Optional in-process search over Venue.name and Artist.name.
+#
+# Each name is split into lower-cased character n-grams; every n-gram maps to
+# a sorted array('i') of the ids containing it. A search intersects the
+# posting lists of the term's n-grams (smallest first) and confirms the
+# substring match on the few surviving names, so no query reaches Postgres.
+#
+# The index is built on the first request and kept current from SQLAlchemy
+# session hooks: ids written in a flush are collected in session.info and
+# applied once the transaction commits (dropped on rollback). Each worker
+# process holds its own copy and only sees its own writes immediately; other
+# workers catch up when they restart. When SEARCH_INDEX_ENABLED is off, or the
+# index is not built yet, searches go to queries.search_* instead.
+
+class NGramIndex:
+
+    def __init__(self, n=3):
+        self.n = n
+        self.names = {}
+        self.postings = {}
+        self.lock = threading.RLock()
+
+    def grams(self, text):
+        text = text.lower()
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, doc_id, name):
+        with self.lock:
+            self.remove(doc_id)
+            name = name or ''
+            self.names[doc_id] = name
+            for gram in self.grams(name):
+                ids = self.postings.get(gram)
+                if ids is None:
+                    ids = self.postings[gram] = array('i')
+                i = bisect_left(ids, doc_id)
+                if i == len(ids) or ids[i] != doc_id:
+                    ids.insert(i, doc_id)
+
+    def remove(self, doc_id):
+        with self.lock:
+            name = self.names.pop(doc_id, None)
+            if name is None:
+                return
+            for gram in self.grams(name):
+                ids = self.postings.get(gram)
+                if ids is None:
+                    continue
+                i = bisect_left(ids, doc_id)
+                if i < len(ids) and ids[i] == doc_id:
+                    del ids[i]
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, term):
+        term = (term or '').strip().lower()
+        with self.lock:
+            if len(term) < self.n:
+                # too short to contain an n-gram: scan the names instead
+                candidates = self.names.keys()
+            else:
+                lists = sorted((self.postings.get(g, ()) for g in self.grams(term)), key=len)
+                candidates = set(lists[0])
+                for ids in lists[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(ids)
+            hits = [(doc_id, self.names[doc_id]) for doc_id in candidates
+                    if term in self.names[doc_id].lower()]
+        # names starting with the term first, then the closest (shortest) names
+        hits.sort(key=lambda h: (not h[1].lower().startswith(term), len(h[1]), h[1], h[0]))
+        return hits
+
+    def memory_bytes(self):
+        with self.lock:
+            size = sys.getsizeof(self.names) + sys.getsizeof(self.postings)
+            size += sum(sys.getsizeof(name) for name in self.names.values())
+            size += sum(sys.getsizeof(gram) + sys.getsizeof(ids) for gram, ids in self.postings.items())
+            return size
+
+    def stats(self):
+        with self.lock:
+            return {
+                "documents": len(self.names),
+                "ngrams": len(self.postings),
+                "postings": sum(len(ids) for ids in self.postings.values()),
+                "memory_bytes": self.memory_bytes(),
+            }
+
+
+class SearchIndex:
+
+    def __init__(self):
+        self.enabled = False
+        self.ready = False
+        self.build_seconds = None
+        self.venues = NGramIndex()
+        self.artists = NGramIndex()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SEARCH_INDEX_ENABLED', False)
+        self.venues = NGramIndex(app.config.get('SEARCH_INDEX_NGRAM', 3))
+        self.artists = NGramIndex(app.config.get('SEARCH_INDEX_NGRAM', 3))
+        self.ready = False
+        app.cli.add_command(search_index_cli)
+        if not self.enabled:
+            return
+
+        @app.before_first_request
+        def build_search_index():
+            # already built when the WSGI entry point preloaded it (wsgi.py)
+            if self.ready:
+                return
+            self.build()
+            app.logger.info('search index built in %.3fs: %s', self.build_seconds, self.stats())
+
+        if not event.contains(db.session, 'after_flush', _collect_changes):
+            event.listen(db.session, 'after_flush', _collect_changes)
+            event.listen(db.session, 'after_commit', self._apply_changes)
+            event.listen(db.session, 'after_rollback', _discard_changes)
+
+    def build(self):
+        started = time.perf_counter()
+        venues, artists = NGramIndex(self.venues.n), NGramIndex(self.artists.n)
+        for doc_id, name in db.session.query(Venue.id, Venue.name).yield_per(10000):
+            venues.add(doc_id, name)
+        for doc_id, name in db.session.query(Artist.id, Artist.name).yield_per(10000):
+            artists.add(doc_id, name)
+        self.venues, self.artists = venues, artists
+        self.build_seconds = time.perf_counter() - started
+        self.ready = True
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "build_seconds": self.build_seconds,
+            "venues": self.venues.stats(),
+            "artists": self.artists.stats(),
+        }
+
+    def _apply_changes(self, session):
+        changes = session.info.pop('search_index_changes', None)
+        if not changes or not self.ready:
+            return
+        for model, doc_id, name in changes:
+            index = self.venues if model is Venue else self.artists
+            if name is None:
+                index.remove(doc_id)
+            else:
+                index.add(doc_id, name)
+
+    def _page(self, hits, page, per_page):
+        total = len(hits)
+        start = (page - 1) * per_page
+        return {
+            "count": total,
+            "data": [{"id": doc_id, "name": name} for doc_id, name in hits[start:start + per_page]],
+            "page": page,
+            "prev_page": page - 1 if page > 1 else None,
+            "next_page": page + 1 if page * per_page < total else None,
+        }
+
+    def search_venues(self, term, page=1, per_page=20):
+        if not (self.enabled and self.ready):
+            return queries.search_venues(term, page=page, per_page=per_page)
+        return self._page(self.venues.search(term), page, per_page)
+
+    def search_artists(self, term, page=1, per_page=20):
+        if not (self.enabled and self.ready):
+            return queries.search_artists(term, page=page, per_page=per_page)
+        return self._page(self.artists.search(term), page, per_page)
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('search_index_changes', [])
+    for obj in session.new.union(session.dirty):
+        if isinstance(obj, (Venue, Artist)):
+            changes.append((type(obj), obj.id, obj.name or ''))
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            changes.append((type(obj), obj.id, None))
+
+
+def _discard_changes(session):
+    session.info.pop('search_index_changes', None)
+
+
+search_index = SearchIndex()
+
+
+@click.group('search-index')
+def search_index_cli():
+    """In-memory search index commands."""
+
+
+@search_index_cli.command('stats')
+@with_appcontext
+def stats_command():
+    """Build the index and report its size and build time."""
+    search_index.build()
+    stats = search_index.stats()
+    click.echo('built in %.3fs' % stats['build_seconds'])
+    for kind in ('venues', 'artists'):
+        click.echo('%s: %s' % (kind, stats[kind]))
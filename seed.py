@@ -0,0 +1,238 @@
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+
+import summaries
+from importer import copy_rows
+from models import Venue, Artist, Shows, db
+from validation import GENRES
+
+
+# `flask seed` synthetic data for load and scale testing.
+#
+# Everything is drawn from one random.Random(seed), so the same options give
+# the same rows (start from an empty database, or use --truncate, so the ids
+# match too). Venues and artists get a Zipf-like popularity rank: the show
+# count of the k-th most popular is roughly proportional to 1/k**skew, as are
+# cities and genres. Show times are spread over --past-days before and
+# --future-days after today, in the evening, on the half hour, and last one
+# to two and a half hours. Rows are written with COPY in chunks of
+# --chunk-size; drawn shows that would double-book a venue or an artist are
+# dropped (so popular venues fill up), and the count reported.
+#
+# A replay file (--replay) lists popular-weighted venue/artist ids and search
+# terms taken from the generated names, for benchmarks to request.
+
+# (city, state), most populous first
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Austin', 'TX'), ('San Jose', 'CA'), ('Jacksonville', 'FL'),
+    ('Columbus', 'OH'), ('Charlotte', 'NC'), ('San Francisco', 'CA'), ('Seattle', 'WA'),
+    ('Denver', 'CO'), ('Washington', 'DC'), ('Nashville', 'TN'), ('Boston', 'MA'),
+    ('Portland', 'OR'), ('Las Vegas', 'NV'), ('Detroit', 'MI'), ('Memphis', 'TN'),
+    ('Louisville', 'KY'), ('Baltimore', 'MD'), ('Milwaukee', 'WI'), ('Albuquerque', 'NM'),
+    ('Atlanta', 'GA'), ('Kansas City', 'MO'), ('Miami', 'FL'), ('Minneapolis', 'MN'),
+    ('New Orleans', 'LA'), ('Salt Lake City', 'UT'), ('Boise', 'ID'), ('Omaha', 'NE'),
+    ('Providence', 'RI'), ('Burlington', 'VT'), ('Anchorage', 'AK'), ('Honolulu', 'HI'),
+]
+
+VENUE_WORDS = (
+    ['The'],
+    ['Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Silver', 'Crooked', 'Lucky', 'Old',
+     'Midnight', 'Rusty', 'Neon', 'Wild', 'Hidden', 'Royal', 'Black Cat', 'Copper', 'Lonely'],
+    ['Room', 'Lounge', 'Hall', 'Tavern', 'Ballroom', 'Theatre', 'Cellar', 'Warehouse',
+     'Garden', 'Saloon', 'Club', 'Pavilion', 'Bar & Grill', 'Music Hall', 'Coffee House'],
+)
+ARTIST_WORDS = (
+    ['Guns N', 'The Wild', 'Matt', 'Lady', 'Captain', 'The Broken', 'Little', 'Big',
+     'Sister', 'The Velvet', 'Brother', 'The Electric', 'Howlin', 'Saint', 'The Lonesome'],
+    ['Petals', 'Sax', 'Quevedo', 'Wolves', 'Harmony', 'Echoes', 'Rivers', 'Lights', 'Kings',
+     'Ramblers', 'Sparrows', 'Comets', 'Shadows', 'Strings', 'Tigers', 'Hearts'],
+    ['', '', '', ' Band', ' Trio', ' Quartet', ' Collective', ' & the Machines', ' Orchestra'],
+)
+# show lengths in minutes
+DURATIONS = (60, 90, 120, 150)
+
+
+def zipf_weights(n, skew):
+    # cumulative weights for random.choices
+    return list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+class Generator:
+
+    def __init__(self, seed, skew, past_days, future_days, now=None):
+        self.rng = random.Random(seed)
+        self.skew = skew
+        self.city_weights = zipf_weights(len(CITIES), skew)
+        # sorted, so a seed gives the same genres in every process
+        self.genres = sorted(GENRES)
+        self.genre_weights = zipf_weights(len(self.genres), 0.8)
+        now = now or datetime.now()
+        self.first_day = datetime(now.year, now.month, now.day) - timedelta(days=past_days)
+        self.days = past_days + future_days
+        # ids by popularity, most popular first; set by shows()
+        self.venue_ranking = []
+        self.artist_ranking = []
+
+    def _genres(self):
+        count = self.rng.choices((1, 2, 3), (5, 3, 1))[0]
+        return sorted(set(self.rng.choices(self.genres, cum_weights=self.genre_weights, k=count)))
+
+    def _phone(self):
+        return '%03d-%03d-%04d' % (self.rng.randint(201, 989), self.rng.randint(200, 999),
+                                   self.rng.randint(0, 9999))
+
+    def venues(self, count):
+        rng = self.rng
+        for i in range(count):
+            city, state = rng.choices(CITIES, cum_weights=self.city_weights)[0]
+            name = '%s %s %s %d' % (VENUE_WORDS[0][0], rng.choice(VENUE_WORDS[1]),
+                                    rng.choice(VENUE_WORDS[2]), i + 1)
+            slug = 'venue%d' % (i + 1)
+            seeking = rng.random() < 0.3
+            yield (name, city, state, '%d %s St' % (rng.randint(1, 9999), rng.choice(VENUE_WORDS[1])),
+                   self._phone(), self._genres(), 'https://images.example.com/%s.jpg' % slug,
+                   'https://www.facebook.com/%s' % slug, 'https://%s.example.com' % slug,
+                   seeking, 'Looking for local acts' if seeking else '')
+
+    def artists(self, count):
+        rng = self.rng
+        for i in range(count):
+            city, state = rng.choices(CITIES, cum_weights=self.city_weights)[0]
+            name = '%s %s%s %d' % (rng.choice(ARTIST_WORDS[0]), rng.choice(ARTIST_WORDS[1]),
+                                   rng.choice(ARTIST_WORDS[2]), i + 1)
+            slug = 'artist%d' % (i + 1)
+            seeking = rng.random() < 0.4
+            yield (name, city, state, self._phone(), self._genres(),
+                   'https://images.example.com/%s.jpg' % slug, 'https://www.facebook.com/%s' % slug,
+                   'https://%s.example.com' % slug, seeking, 'Booking now' if seeking else '')
+
+    def shows(self, count, venue_ids, artist_ids, chunk_size):
+        rng = self.rng
+        # popularity rank is a random permutation of the ids
+        venue_ids, artist_ids = list(venue_ids), list(artist_ids)
+        rng.shuffle(venue_ids)
+        rng.shuffle(artist_ids)
+        self.venue_ranking, self.artist_ranking = venue_ids, artist_ids
+        venue_weights = zipf_weights(len(venue_ids), self.skew)
+        artist_weights = zipf_weights(len(artist_ids), self.skew)
+        slots = self.days * 12  # 18:00 to 23:30 on the half hour
+        while count > 0:
+            k = min(chunk_size, count)
+            count -= k
+            venues = rng.choices(venue_ids, cum_weights=venue_weights, k=k)
+            artists = rng.choices(artist_ids, cum_weights=artist_weights, k=k)
+            yield [(v, a, self.first_day + timedelta(days=slot // 12, minutes=18 * 60 + 30 * (slot % 12)),
+                    rng.choice(DURATIONS))
+                   for v, a, slot in zip(venues, artists, (rng.randrange(slots) for _ in range(k)))]
+
+    def replay(self, venue_names, artist_names, size):
+        rng = self.rng
+        terms = set()
+        for name in rng.sample(venue_names, min(size, len(venue_names))) + \
+                rng.sample(artist_names, min(size, len(artist_names))):
+            # a word of the name (not the trailing number), or a prefix of it
+            words = [w for w in name.split()[:-1] if len(w) >= 3 and w.isalpha()]
+            if words:
+                word = rng.choice(words)
+                terms.add(word[:rng.randint(3, len(word))].lower())
+        return {
+            "venue_ids": self._popular(self.venue_ranking, size),
+            "artist_ids": self._popular(self.artist_ranking, size),
+            "search_terms": sorted(terms),
+        }
+
+    def _popular(self, ids, size):
+        if not ids:
+            return []
+        return self.rng.choices(ids, cum_weights=zipf_weights(len(ids), self.skew), k=size)
+
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _load(table, columns, chunks, label, skip_conflicts=False):
+    started = time.perf_counter()
+    loaded = skipped = 0
+    for chunk in chunks:
+        written = copy_rows(table, columns, chunk, skip_conflicts)
+        loaded += written
+        skipped += len(chunk) - written
+        elapsed = time.perf_counter() - started
+        click.echo('\r%s: %d rows, %.0f rows/s' % (
+            label, loaded, (loaded + skipped) / elapsed if elapsed else 0), nl=False)
+    db.session.commit()
+    click.echo(', %d skipped as double bookings' % skipped if skipped else '')
+    return loaded
+
+
+@click.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=50000, show_default=True)
+@click.option('--seed', default=1, show_default=True, help='Random seed.')
+@click.option('--skew', default=1.1, show_default=True, help='Zipf exponent of venue/artist popularity.')
+@click.option('--past-days', default=730, show_default=True)
+@click.option('--future-days', default=365, show_default=True)
+@click.option('--chunk-size', default=100000, show_default=True, help='Rows per COPY.')
+@click.option('--truncate', is_flag=True, help='Empty Venue, Artist and Shows first.')
+@click.option('--replay', 'replay_path', type=click.Path(dir_okay=False),
+              help='Where to write ids and search terms for benchmarks '
+                   '[default: <instance>/seed_replay.json].')
+@click.option('--replay-size', default=1000, show_default=True)
+@with_appcontext
+def seed_command(venues, artists, shows, seed, skew, past_days, future_days, chunk_size,
+                 truncate, replay_path, replay_size):
+    """Generate synthetic venues, artists and shows."""
+    if truncate:
+        db.session.execute(text('TRUNCATE "Shows", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+        db.session.commit()
+    generator = Generator(seed, skew, past_days, future_days)
+    started = time.perf_counter()
+
+    first_venue = (db.session.query(func.max(Venue.id)).scalar() or 0) + 1
+    first_artist = (db.session.query(func.max(Artist.id)).scalar() or 0) + 1
+    _load(Venue.__table__, (
+        'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link',
+        'website_link', 'looking_for_talent', 'seeking_description'),
+        _chunks(generator.venues(venues), chunk_size), 'venues')
+    _load(Artist.__table__, (
+        'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+        'website_link', 'looking_for_venue', 'seeking_description'),
+        _chunks(generator.artists(artists), chunk_size), 'artists')
+
+    venue_rows = db.session.query(Venue.id, Venue.name).filter(Venue.id >= first_venue).order_by(Venue.id).all()
+    artist_rows = db.session.query(Artist.id, Artist.name).filter(Artist.id >= first_artist).order_by(Artist.id).all()
+    venue_ids = [r.id for r in venue_rows]
+    artist_ids = [r.id for r in artist_rows]
+    if shows and venue_ids and artist_ids:
+        _load(Shows.__table__, ('venue_id', 'artist_id', 'start_time', 'duration_minutes'),
+              generator.shows(shows, venue_ids, artist_ids, chunk_size), 'shows', skip_conflicts=True)
+
+    click.echo('rebuilt %d summary rows' % summaries.rebuild())
+    db.session.execute(text('ANALYZE "Venue", "Artist", "Shows"'))
+    db.session.commit()
+
+    replay_path = replay_path or os.path.join(current_app.instance_path, 'seed_replay.json')
+    os.makedirs(os.path.dirname(os.path.abspath(replay_path)), exist_ok=True)
+    replay = generator.replay([r.name for r in venue_rows], [r.name for r in artist_rows], replay_size)
+    replay.update({"seed": seed, "venues": venues, "artists": artists, "shows": shows})
+    with open(replay_path, 'w') as f:
+        json.dump(replay, f)
+    click.echo('done in %.1fs; replay data in %s' % (time.perf_counter() - started, replay_path))
@@ -0,0 +1,97 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+# `flask startup-profile`: where a cold start spends its time.
+#
+# Every run starts a fresh interpreter with -X importtime, as a new worker
+# would be, which imports app, calls create_app() like wsgi.py does (without
+# the CLI commands) and serves one request through the test client. The
+# report has the median of each phase over --runs runs and the import time
+# of every top-level package, counting each module's own time only so shared
+# dependencies are not counted twice. With --max-ms the command fails when
+# the median time to first request is over it, which makes it a startup
+# benchmark for CI.
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app(cli=False)
+created = time.perf_counter()
+status = application.test_client().get(sys.argv[1]).status_code
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (done - created) * 1000, "status": status}))
+'''
+
+PHASES = ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms')
+
+
+def probe(root, path, env):
+    # ({phase: ms}, Counter of import self-time in ms by top-level package)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE, path],
+                            cwd=root, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        raise click.ClickException('startup probe failed:\n%s' % result.stderr[-2000:])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = elapsed
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            packages[name.strip().split('.')[0]] += int(self_us) / 1000.0
+    return timings, packages
+
+
+@click.command('startup-profile')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters to start.')
+@click.option('--path', default='/', show_default=True, help='Path of the first request.')
+@click.option('--profile', default='benchmark', show_default=True,
+              help='Config profile (FYYUR_ENV) of the probe.')
+@click.option('--top', default=15, show_default=True, help='Packages to list.')
+@click.option('--max-ms', type=float, help='Fail if the median time to first request is over this.')
+@with_appcontext
+def startup_profile_command(runs, path, profile, top, max_ms):
+    """Measure cold start time and break it down by imported package."""
+    env = dict(os.environ, FYYUR_ENV=profile)
+    env.setdefault('SECRET_KEY', 'startup-profile')
+    # bytecode caching as in a deployed worker
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    probe(current_app.root_path, path, env)  # writes the .pyc files
+
+    runs = [probe(current_app.root_path, path, env) for _ in range(max(runs, 1))]
+    medians = {phase: statistics.median(t[phase] for t, _ in runs) for phase in PHASES}
+    first_request = medians['import_ms'] + medians['create_app_ms'] + medians['first_request_ms']
+    packages = Counter()
+    for _, run_packages in runs:
+        packages.update(run_packages)
+    total_imports = sum(packages.values())
+
+    click.echo('time to first request: %.1fms (median of %d, GET %s -> %d)' % (
+        first_request, len(runs), path, runs[0][0]['status']))
+    click.echo('  import app     %8.1fms' % medians['import_ms'])
+    click.echo('  create_app()   %8.1fms' % medians['create_app_ms'])
+    click.echo('  first request  %8.1fms' % medians['first_request_ms'])
+    click.echo('  whole process  %8.1fms (with interpreter start and exit)' % medians['process_ms'])
+    click.echo('imports by top-level package (own time, mean per run):')
+    for name, total in packages.most_common(top):
+        click.echo('  %-24s %8.1fms %5.1f%%' % (name, total / len(runs), 100.0 * total / total_imports))
+    if max_ms is not None and first_request > max_ms:
+        click.echo('time to first request %.1fms is over %.1fms' % (first_request, max_ms), err=True)
+        raise SystemExit(1)
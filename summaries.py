@@ -0,0 +1,155 @@
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert
+
+import facets
+from models import Venue, Artist, Shows, VenueShowSummary, ArtistShowSummary, db
+
+
+# Maintenance of VenueShowSummary / ArtistShowSummary.
+#
+# - A new show adds itself to the counts of its venue and artist with an
+#   upsert in the same transaction (after_flush), so concurrent bookings
+#   never overwrite each other's counts.
+# - Deleted or edited shows recompute the rows they belonged to.
+# - Time moves shows from upcoming to past without any write; the rows this
+#   affects are exactly those whose next_show_time has passed, and
+#   `flask summaries refresh` (run from cron or a scheduler, e.g. every
+#   minute) recomputes just those.
+# - `flask summaries rebuild` recomputes every row.
+# Whether a venue or artist has upcoming shows is also a browse facet, so each
+# of these recounts the facet rows of the venues and artists it recomputed
+# (facets.py).
+
+SUMMARIES = (
+    (VenueShowSummary, VenueShowSummary.venue_id, Venue, Shows.venue_id),
+    (ArtistShowSummary, ArtistShowSummary.artist_id, Artist, Shows.artist_id),
+)
+
+
+def _recompute(summary, key, owner, owner_column, ids=None, now=None):
+    now = now or datetime.now()
+    upcoming = Shows.start_time > now
+    source = select(
+        owner.id,
+        func.count(Shows.id).filter(upcoming),
+        func.count(Shows.id).filter(~upcoming),
+        func.min(Shows.start_time).filter(upcoming),
+        func.max(Shows.start_time).filter(~upcoming),
+        literal(now),
+    ).select_from(owner).outerjoin(Shows, owner_column == owner.id).group_by(owner.id)
+    if ids is not None:
+        source = source.where(owner.id.in_(ids))
+
+    columns = ['upcoming_count', 'past_count', 'next_show_time', 'last_show_time', 'refreshed_at']
+    stmt = insert(summary).from_select([key.name] + columns, source)
+    return stmt.on_conflict_do_update(
+        index_elements=[key.name],
+        set_={c: stmt.excluded[c] for c in columns})
+
+
+def _add_show(summary, key, owner_id, start_time, now):
+    upcoming = start_time > now
+    stmt = insert(summary).values({
+        key.name: owner_id,
+        "upcoming_count": 1 if upcoming else 0,
+        "past_count": 0 if upcoming else 1,
+        "next_show_time": start_time if upcoming else None,
+        "last_show_time": None if upcoming else start_time,
+        "refreshed_at": now,
+    })
+    # LEAST/GREATEST ignore NULLs in Postgres
+    return stmt.on_conflict_do_update(index_elements=[key.name], set_={
+        "upcoming_count": summary.upcoming_count + stmt.excluded.upcoming_count,
+        "past_count": summary.past_count + stmt.excluded.past_count,
+        "next_show_time": func.least(summary.next_show_time, stmt.excluded.next_show_time),
+        "last_show_time": func.greatest(summary.last_show_time, stmt.excluded.last_show_time),
+        "refreshed_at": stmt.excluded.refreshed_at,
+    })
+
+
+def _apply_show_changes(session, flush_context):
+    added = [obj for obj in session.new if isinstance(obj, Shows)]
+    changed = [obj for obj in session.dirty | session.deleted if isinstance(obj, Shows)]
+    if not (added or changed):
+        return
+    now = datetime.now()
+    connection = session.connection()
+    for summary, key, owner, owner_column in SUMMARIES:
+        owner_attr = owner_column.key
+        for show in added:
+            connection.execute(_add_show(summary, key, getattr(show, owner_attr), show.start_time, now))
+        ids = {getattr(show, owner_attr) for show in changed}
+        # an edit may also have moved the show away from its old venue/artist
+        for show in changed:
+            history = inspect(show).attrs[owner_attr].history
+            ids.update(history.deleted or ())
+        if ids:
+            connection.execute(_recompute(summary, key, owner, owner_column, ids, now))
+        ids.update(getattr(show, owner_attr) for show in added)
+        facets.recount_owners(owner, ids, might_flip=True)
+
+
+def recompute(venue_ids=(), artist_ids=(), now=None):
+    # for writes that bypass the ORM hooks (bulk import); the caller commits
+    now = now or datetime.now()
+    for (summary, key, owner, owner_column), ids in zip(SUMMARIES, (venue_ids, artist_ids)):
+        if ids:
+            db.session.execute(_recompute(summary, key, owner, owner_column, list(ids), now))
+            facets.recount_owners(owner, list(ids))
+
+
+def refresh_due(now=None):
+    # recompute rows whose next show has started since they were computed
+    now = now or datetime.now()
+    refreshed = 0
+    for summary, key, owner, owner_column in SUMMARIES:
+        ids = db.session.execute(select(key).where(summary.next_show_time <= now)).scalars().all()
+        if ids:
+            refreshed += db.session.execute(_recompute(summary, key, owner, owner_column, ids, now)).rowcount
+            facets.recount_owners(owner, ids)
+    db.session.commit()
+    return refreshed
+
+
+def rebuild(now=None):
+    now = now or datetime.now()
+    rebuilt = 0
+    for summary, key, owner, owner_column in SUMMARIES:
+        rebuilt += db.session.execute(_recompute(summary, key, owner, owner_column, now=now)).rowcount
+    db.session.commit()
+    facets.rebuild()
+    return rebuilt
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _apply_show_changes):
+        event.listen(db.session, 'after_flush', _apply_show_changes)
+    app.cli.add_command(summaries_cli)
+
+
+@click.group('summaries')
+def summaries_cli():
+    """Venue/artist show count summary commands."""
+
+
+@summaries_cli.command('refresh')
+@with_appcontext
+def refresh_command():
+    """Recompute summaries whose next show has started."""
+    started = time.perf_counter()
+    count = refresh_due()
+    click.echo('refreshed %d rows in %.2fs' % (count, time.perf_counter() - started))
+
+
+@summaries_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute every venue and artist summary."""
+    started = time.perf_counter()
+    count = rebuild()
+    click.echo('rebuilt %d rows in %.2fs' % (count, time.perf_counter() - started))
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from models import Venue, Artist, Shows, db
+from querycount import QueryCounter
+
+
+# The tests run against a PostgreSQL database of their own, named by
+# TEST_DATABASE_URL (genre arrays, tsrange and the GiST exclusion constraints
+# have no SQLite counterpart). Its public schema is dropped and rebuilt by the
+# migrations at the start of every run.
+
+@pytest.fixture(scope='session')
+def app():
+    if not os.environ.get('TEST_DATABASE_URL'):
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from app import create_app
+    from flask_migrate import upgrade
+
+    app = create_app('testing', cli=True)
+    with app.app_context():
+        db.session.execute(text('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+        db.session.commit()
+        upgrade(directory=os.path.join(app.root_path, 'migrations'))
+        db.session.remove()
+    return app
+
+
+def _venue(name, city='San Francisco', state='CA', genres=('Jazz',)):
+    return Venue(name=name, city=city, state=state, address='1 Main St', phone='123-123-1234',
+                 genres=list(genres), image_link='https://example.com/%s.jpg' % name)
+
+
+def _artist(name, city='San Francisco', state='CA', genres=('Jazz',)):
+    return Artist(name=name, city=city, state=state, phone='123-123-1234',
+                  genres=list(genres), image_link='https://example.com/%s.jpg' % name)
+
+
+@pytest.fixture(scope='session')
+def data(app):
+    # a busy venue and artist with past and upcoming shows together, and a
+    # quiet venue and artist with one upcoming show each
+    with app.app_context():
+        busy_venue, quiet_venue = _venue('Busy Hall'), _venue('Quiet Room', 'New York', 'NY', ('Folk',))
+        busy_artist, quiet_artist = _artist('Busy Band'), _artist('Quiet Duo', 'New York', 'NY', ('Folk',))
+        db.session.add_all([busy_venue, quiet_venue, busy_artist, quiet_artist])
+        db.session.flush()
+        now = datetime.now().replace(microsecond=0)
+        for day in range(-8, 8):
+            if day:
+                db.session.add(Shows(venue_id=busy_venue.id, artist_id=busy_artist.id,
+                                     start_time=now + timedelta(days=day)))
+        db.session.add(Shows(venue_id=quiet_venue.id, artist_id=quiet_artist.id,
+                             start_time=now + timedelta(days=3)))
+        db.session.commit()
+        ids = {"busy_venue": busy_venue.id, "quiet_venue": quiet_venue.id,
+               "busy_artist": busy_artist.id, "quiet_artist": quiet_artist.id}
+        db.session.remove()
+    return ids
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app, client):
+    # (response, number of SQL statements it took)
+    with app.app_context():
+        engine = db.engine
+
+    def count(method, path, **kwargs):
+        with QueryCounter(engine) as counter:
+            response = client.open(path, method=method, **kwargs)
+        return response, counter.count
+    return count
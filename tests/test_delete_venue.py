@@ -0,0 +1,53 @@
+from sqlalchemy import event, text
+
+from models import Venue, db
+
+from conftest import _venue
+
+
+def _new_venue(app):
+    with app.app_context():
+        venue = _venue('Short Lease')
+        db.session.add(venue)
+        db.session.commit()
+        venue_id = venue.id
+        db.session.remove()
+    return venue_id
+
+
+def _exists(app, venue_id):
+    with app.app_context():
+        found = db.session.query(Venue.id).filter_by(id=venue_id).first() is not None
+        db.session.remove()
+    return found
+
+
+def test_unknown_venue_is_not_found(client):
+    assert client.delete('/venues/999999').status_code == 404
+
+
+def test_venue_is_deleted(app, client):
+    venue_id = _new_venue(app)
+    assert client.delete('/venues/%d' % venue_id).status_code == 204
+    assert not _exists(app, venue_id)
+
+
+def test_venue_changed_meanwhile_is_a_conflict(app, client):
+    # another transaction updates the venue between the view loading it and
+    # deleting it, so the DELETE's version check matches no row
+    venue_id = _new_venue(app)
+    with app.app_context():
+        engine = db.engine
+
+    def update_elsewhere(session, flush_context, instances):
+        with engine.begin() as connection:
+            connection.execute(text('UPDATE "Venue" SET version = version + 1 WHERE id = :id'),
+                               {"id": venue_id})
+
+    event.listen(db.session, 'before_flush', update_elsewhere, once=True)
+    try:
+        assert client.delete('/venues/%d' % venue_id).status_code == 409
+    finally:
+        if event.contains(db.session, 'before_flush', update_elsewhere):
+            event.remove(db.session, 'before_flush', update_elsewhere)
+    assert _exists(app, venue_id)
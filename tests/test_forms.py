@@ -0,0 +1,19 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+
+@pytest.mark.parametrize('duration, error', [
+    ('90', None),
+    ('0', 'Number must be between 15 and 720.'),
+    ('721', 'Number must be between 15 and 720.'),
+    ('', 'This field is required.'),
+])
+def test_show_duration(app, duration, error):
+    from forms import ShowForm
+    with app.test_request_context():
+        form = ShowForm(MultiDict({
+            "venue_id": "1", "artist_id": "1", "start_time": "2026-12-01 20:00:00",
+            "duration_minutes": duration,
+        }), meta={'csrf': False})
+        assert form.validate() is (error is None)
+        assert form.errors.get('duration_minutes', [None])[0] == error
@@ -0,0 +1,22 @@
+from enums import Genre
+from models import Venue, db
+
+
+def test_bits_follow_declaration_order():
+    assert [genre.bit for genre in Genre] == [1 << i for i in range(len(Genre))]
+    assert Genre.mask(['Jazz', 'Blues', 'Not a genre']) == Genre.Jazz.bit | Genre.Blues.bit
+    assert Genre.mask(None) == 0
+
+
+def test_mask_matches_genre_mask_of(app, data):
+    # Genre.mask and the genre_mask_of() SQL function behind the column agree
+    with app.app_context():
+        venue = Venue(name='Every Genre', city='Austin', state='TX', address='3 Loud St',
+                      genres=[genre.value for genre in Genre])
+        db.session.add(venue)
+        db.session.flush()
+        rows = db.session.query(Venue.genres, Venue.genre_mask).all()
+        db.session.rollback()
+    assert rows
+    for genres, mask in rows:
+        assert mask == Genre.mask(genres)
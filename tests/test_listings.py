@@ -0,0 +1,70 @@
+import pytest
+
+import queries
+from models import Venue, Artist, db
+
+
+# Keyset pages of the listings cover every row exactly once, walked forward
+# through the next cursors and back through the prev ones, with rows whose
+# sort key columns are NULL among them.
+
+@pytest.fixture
+def null_keyed(app, data):
+    with app.app_context():
+        rows = [
+            Venue(name='No City', city=None, state='CA', address='4 Nowhere', genres=['Jazz']),
+            Venue(name='No City Either', city=None, state='CA', address='5 Nowhere', genres=['Jazz']),
+            Venue(name=None, city='San Francisco', state='CA', address='6 Nowhere', genres=['Jazz']),
+            Venue(name='No State', city='Springfield', state=None, address='7 Nowhere', genres=['Jazz']),
+            Artist(name=None, city='San Francisco', state='CA', genres=['Jazz']),
+            Artist(name='No State', city='Springfield', state=None, genres=['Jazz']),
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        yield
+        for row in rows:
+            db.session.delete(row)
+        db.session.commit()
+        db.session.remove()
+
+
+def _venue_ids(areas):
+    return [venue['id'] for area in areas for venue in area['venues']]
+
+
+def _artist_ids(artists):
+    return [artist['id'] for artist in artists]
+
+
+def _walk(page, ids, **kwargs):
+    # ids of every page, forward from the first, then back from the last
+    forward, pager = [], {"next": None}
+    while True:
+        rows, pager = page(after=pager['next'], per_page=2, **kwargs)
+        forward.extend(ids(rows))
+        if pager['next'] is None:
+            break
+    backward = ids(rows)
+    while pager['prev'] is not None:
+        rows, pager = page(before=pager['prev'], per_page=2, **kwargs)
+        backward[:0] = ids(rows)
+    return forward, backward
+
+
+@pytest.mark.parametrize('owner, page, ids', [
+    (Venue, queries.venue_areas, _venue_ids),
+    (Artist, queries.artists_page, _artist_ids),
+])
+@pytest.mark.parametrize('filters', [None, {"state": "CA"}])
+@pytest.mark.parametrize('sort', [False, True])
+def test_pages_cover_every_row(app, null_keyed, owner, page, ids, filters, sort):
+    with app.app_context():
+        expected = owner.query.with_entities(owner.id)
+        if filters:
+            expected = expected.filter(owner.state == filters['state'])
+        expected = sorted(row.id for row in expected)
+        forward, backward = _walk(page, ids, filters=filters, sort=sort)
+        db.session.remove()
+    assert sorted(forward) == expected
+    assert len(forward) == len(set(forward))
+    assert backward == forward
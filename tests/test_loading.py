@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+import queries
+from models import Venue, Artist, Shows, db
+
+
+# Loading profiles (queries.py) and raise_on_lazy_load (models.py): a view
+# touching a relationship it did not load fails instead of querying, and the
+# read pages take the same number of statements however many shows an entity
+# has, within their view's @query_budget.
+
+def test_raise_on_lazy_load(app, data):
+    with app.app_context():
+        venue = Venue.query.options(*queries.VENUE_DETAIL).get(data['busy_venue'])
+        with pytest.raises(InvalidRequestError):
+            venue.shows
+        artist = Artist.query.options(*queries.ARTIST_FORM).get(data['busy_artist'])
+        with pytest.raises(InvalidRequestError):
+            artist.shows
+        # also without a profile, and on many-to-one relationships
+        show = Shows.query.filter_by(venue_id=data['quiet_venue']).one()
+        with pytest.raises(InvalidRequestError):
+            show.venue
+        db.session.remove()
+
+
+def test_relationships_a_query_loads_still_load(app, data):
+    with app.app_context():
+        venue = Venue.query.options(*queries.VENUE_DELETE).get(data['busy_venue'])
+        assert len(venue.shows) == 15
+        db.session.remove()
+
+
+@pytest.mark.parametrize('path, busy, quiet', [
+    ('/venues/%d', 'busy_venue', 'quiet_venue'),
+    ('/artists/%d', 'busy_artist', 'quiet_artist'),
+    ('/venues/%d/edit', 'busy_venue', 'quiet_venue'),
+    ('/artists/%d/edit', 'busy_artist', 'quiet_artist'),
+])
+def test_page_query_count_does_not_grow_with_shows(app, data, count_queries, path, busy, quiet):
+    busy_response, busy_count = count_queries('GET', path % data[busy])
+    quiet_response, quiet_count = count_queries('GET', path % data[quiet])
+    assert busy_response.status_code == quiet_response.status_code == 200
+    assert busy_count == quiet_count
+    view = app.view_functions[app.url_map.bind('localhost').match(path % data[busy])[0]]
+    assert busy_count <= view.query_budget
+
+
+@pytest.mark.parametrize('method, path, max_queries', [
+    ('GET', '/venues', 2),
+    ('GET', '/artists', 2),
+    ('GET', '/shows', 1),
+    ('POST', '/venues/search', 1),
+    ('POST', '/artists/search', 1),
+])
+def test_listing_query_counts(data, count_queries, method, path, max_queries):
+    response, count = count_queries(method, path, data={'search_term': 'Quiet'})
+    assert response.status_code == 200
+    assert count <= max_queries
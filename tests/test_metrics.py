@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from metrics import Metrics
+from models import db
+
+
+def _write(directory, name, entries):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(entries, f)
+
+
+def _exited_pid():
+    # a pid no process has: a child that has been reaped
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+
+def test_exited_workers_are_folded(tmp_path):
+    metrics = Metrics()
+    metrics.directory = str(tmp_path)
+    requests = ['fyyur_http_requests_total', [['endpoint', 'main.index']], [3]]
+    checked_out = ['fyyur_db_pool_checked_out', [], [4]]
+    for _ in range(2):
+        _write(str(tmp_path), 'metrics-%d.json' % _exited_pid(), [requests, checked_out])
+
+    collected = metrics.collect()
+    assert collected[('fyyur_http_requests_total', (('endpoint', 'main.index'),))] == [6]
+    # gauges of exited workers are dropped; this process reports its own
+    assert ('fyyur_db_pool_checked_out', ()) not in collected
+    assert sorted(os.listdir(str(tmp_path))) == [
+        'metrics-%d.json' % os.getpid(), 'metrics-exited.json', 'metrics-exited.lock']
+
+    # folded once: collecting again gives the same totals
+    _write(str(tmp_path), 'metrics-%d.json' % _exited_pid(), [requests])
+    collected = metrics.collect()
+    assert collected[('fyyur_http_requests_total', (('endpoint', 'main.index'),))] == [9]
+
+
+def test_failed_statement_leaves_no_start_time(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for _ in range(3):
+                with pytest.raises(ProgrammingError):
+                    connection.execute(text('SELECT * FROM no_such_table'))
+            assert not connection.info.get('metrics_query_start')
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, url_for
+
+from app import bp
+from models import Shows, db
+from querycount import budgeted_routes
+
+from conftest import _venue, _artist
+
+
+# Every route declaring a @query_budget is requested against the fixture
+# database and fails when it goes over budget. The testing profile runs with
+# QUERY_TRACKING = 'raise', so the view's own check raises QueryBudgetExceeded
+# too. Writes are requested with valid data, on their worst case: edits
+# change the columns the facet counts depend on, a new show is the first
+# upcoming one of its venue and artist, and the deleted venue's show is its
+# artist's only upcoming one.
+
+
+def _routes():
+    # the budgets are set on the views, so the blueprint alone lists them
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return [(method, rule.rule, rule.endpoint, budget) for method, rule, budget in budgeted_routes(app)]
+
+
+def _venue_form(name, **overrides):
+    form = {
+        "name": name, "city": "Austin", "state": "TX", "address": "2 Side St",
+        "phone": "512-555-0100", "genres": ["Blues", "Soul"],
+        "facebook_link": "https://www.facebook.com/fyyur", "seeking_talent": "y",
+        "seeking_description": "Looking for a house band",
+    }
+    form.update(overrides)
+    return form
+
+
+def _artist_form(name, **overrides):
+    form = {
+        "name": name, "city": "Austin", "state": "TX",
+        "phone": "512-555-0101", "genres": ["Blues", "Soul"],
+        "facebook_link": "https://www.facebook.com/fyyur", "seeking_venue": "y",
+        "seeking_description": "Looking for a residency",
+    }
+    form.update(overrides)
+    form.pop('address', None)
+    return form
+
+
+def _throwaway_venue(app):
+    # a venue with one upcoming show, by an artist with no other
+    with app.app_context():
+        venue, artist = _venue('Closing Down'), _artist('One Night Only')
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        db.session.add(Shows(venue_id=venue.id, artist_id=artist.id,
+                             start_time=datetime.now() + timedelta(days=40)))
+        db.session.commit()
+        venue_id = venue.id
+        db.session.remove()
+    return venue_id
+
+
+def _show_form(app):
+    # a venue and an artist with no shows yet
+    with app.app_context():
+        venue, artist = _venue('Opening Soon'), _artist('First Timers')
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        form = {
+            "venue_id": venue.id, "artist_id": artist.id,
+            "start_time": (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S'),
+            "duration_minutes": 90,
+        }
+        db.session.remove()
+    return form
+
+
+# (method, endpoint) -> function of (app, data) returning the URL arguments
+# and the form data to send
+REQUESTS = {
+    ('GET', 'main.index'): lambda app, data: ({}, None),
+    ('GET', 'main.venues'): lambda app, data: ({}, None),
+    ('GET', 'main.artists'): lambda app, data: ({}, None),
+    ('GET', 'main.shows'): lambda app, data: ({}, None),
+    ('POST', 'main.search_venues'): lambda app, data: ({}, {"search_term": "Hall"}),
+    ('POST', 'main.search_artists'): lambda app, data: ({}, {"search_term": "Band"}),
+    ('GET', 'main.show_venue'): lambda app, data: ({"venue_id": data['busy_venue']}, None),
+    ('GET', 'main.show_artist'): lambda app, data: ({"artist_id": data['busy_artist']}, None),
+    ('GET', 'main.edit_venue'): lambda app, data: ({"venue_id": data['busy_venue']}, None),
+    ('GET', 'main.edit_artist'): lambda app, data: ({"artist_id": data['busy_artist']}, None),
+    ('GET', 'main.create_venue_form'): lambda app, data: ({}, None),
+    ('GET', 'main.create_artist_form'): lambda app, data: ({}, None),
+    ('GET', 'main.create_shows'): lambda app, data: ({}, None),
+    ('POST', 'main.create_venue_submission'): lambda app, data: ({}, _venue_form('New Venue')),
+    ('POST', 'main.create_artist_submission'): lambda app, data: ({}, _artist_form('New Artist')),
+    ('POST', 'main.edit_venue_submission'): lambda app, data: (
+        {"venue_id": data['busy_venue']}, _venue_form('Busy Hall')),
+    ('POST', 'main.edit_artist_submission'): lambda app, data: (
+        {"artist_id": data['busy_artist']}, _artist_form('Busy Band')),
+    ('POST', 'main.create_show_submission'): lambda app, data: ({}, _show_form(app)),
+    ('DELETE', 'main.delete_venue'): lambda app, data: ({"venue_id": _throwaway_venue(app)}, None),
+}
+
+
+@pytest.mark.parametrize('method, rule, endpoint, budget', _routes())
+def test_route_within_query_budget(app, data, client, count_queries, method, rule, endpoint, budget):
+    assert (method, endpoint) in REQUESTS, 'no test request for %s %s' % (method, rule)
+    args, form = REQUESTS[method, endpoint](app, data)
+    with app.test_request_context():
+        path = url_for(endpoint, **args)
+    response, count = count_queries(method, path, data=form)
+    assert response.status_code < 400
+    assert count <= budget, '%s %s issued %d SQL statements (budget %d)' % (method, path, count, budget)
+    if method == 'POST' and 'search_term' not in form:
+        # shown on the page rendered, or kept for the one redirected to
+        with client.session_transaction() as session:
+            flashed = ' '.join(message for _, message in session.pop('_flashes', []))
+        assert 'successfully' in flashed or b'successfully' in response.data
+
@@ -0,0 +1,80 @@
+import re
+
+from enums import Genre, State
+
+
+# Validation rules shared by VenueForm/ArtistForm and the bulk importer.
+#
+# Lookup sets and patterns are built once at import. validate_batch checks a
+# batch column by column and returns one int per row, with bit i set when
+# rule i failed; errors() turns such a mask back into field messages.
+
+PHONE_PATTERN = re.compile(r'^(\+[1-9][1-9]?)?[ ]?\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
+# same pattern as wtforms.validators.URL
+URL_PATTERN = re.compile(r'^[a-z]+://(?P<host>[^\/\?:]+)(?P<port>:[0-9]+)?(?P<path>\/.*?)?(?P<query>\?.*)?$')
+# genres and states are stored (and submitted by the forms) as enum values
+GENRES = frozenset(genre.value for genre in Genre)
+STATES = frozenset(state.value for state in State)
+
+
+def required(value):
+    return bool(value and str(value).strip())
+
+
+def valid_phone(value):
+    return bool(value) and PHONE_PATTERN.match(value) is not None
+
+
+def valid_url(value):
+    return bool(value) and URL_PATTERN.match(value) is not None
+
+
+def valid_state(value):
+    return value in STATES
+
+
+def valid_genres(values):
+    return bool(values) and GENRES.issuperset(values)
+
+
+# (field, check, message); a rule's position is its bit in the error mask
+VENUE_RULES = (
+    ('name', required, 'This field is required.'),
+    ('city', required, 'This field is required.'),
+    ('state', valid_state, 'Invalid state.'),
+    ('address', required, 'This field is required.'),
+    ('phone', valid_phone, 'Invalid phone number.'),
+    ('genres', valid_genres, 'Invalid genres.'),
+    ('facebook_link', valid_url, 'Invalid URL.'),
+)
+
+ARTIST_RULES = (
+    ('name', required, 'This field is required.'),
+    ('city', required, 'This field is required.'),
+    ('state', valid_state, 'Invalid state.'),
+    ('phone', valid_phone, 'Invalid phone number.'),
+    ('genres', valid_genres, 'Invalid genres.'),
+    ('facebook_link', valid_url, 'Invalid URL.'),
+)
+
+
+def validate_batch(rules, columns, size=None):
+    # columns maps field name -> list of values, all of the same length
+    if size is None:
+        size = len(next(iter(columns.values()))) if columns else 0
+    masks = [0] * size
+    for bit, (field, check, message) in enumerate(rules):
+        flag = 1 << bit
+        for i, ok in enumerate(map(check, columns[field])):
+            if not ok:
+                masks[i] |= flag
+    return masks
+
+
+def validate_record(rules, record):
+    return validate_batch(rules, {field: [record.get(field)] for field, _, _ in rules}, 1)[0]
+
+
+def errors(rules, mask):
+    # [(field, message)] for the rules failed in mask
+    return [(field, message) for bit, (field, _, message) in enumerate(rules) if mask >> bit & 1]
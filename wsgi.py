@@ -0,0 +1,43 @@
+import gc
+
+from app import create_app
+from datefmt import FORMATS, formatter as datetime_formatter
+from genre_masks import genre_masks
+from models import db
+from search_index import search_index
+
+
+# WSGI entry point: `gunicorn wsgi:app` (settings in gunicorn.conf.py), with
+# the profile from FYYUR_ENV, normally production.
+#
+# With preload_app the master imports this module once and forks the workers,
+# which share its memory pages until one of them writes to a page. So what
+# the workers would otherwise each build on their first requests is built
+# here: compiled templates, date patterns and, when enabled, the search index
+# and the genre masks.
+# Connections must not be shared across processes, so the pool is emptied
+# before forking, and gc.freeze() keeps the collector in the workers from
+# touching (and so copying) every page that holds the objects made so far.
+
+app = create_app()
+
+
+def warm_up(app):
+    with app.app_context():
+        for name in app.jinja_env.list_templates(extensions=('html',)):
+            app.jinja_env.get_template(name)
+        for name in FORMATS:
+            datetime_formatter.pattern(name, datetime_formatter.locale)
+        if search_index.enabled:
+            search_index.build()
+            app.logger.info('search index built in %.3fs', search_index.build_seconds)
+        if genre_masks.enabled:
+            genre_masks.build()
+            app.logger.info('genre masks built in %.3fs', genre_masks.build_seconds)
+        db.session.remove()
+        db.engine.dispose()
+
+
+warm_up(app)
+gc.collect()
+gc.freeze()